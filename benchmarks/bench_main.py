@@ -0,0 +1,192 @@
+"""
+End-to-end benchmark of `gen3git.main` against a local fake GitHub (see
+`fake_github.py`), on synthetic repositories of 100, 1k and 10k commits.
+
+    python benchmarks/bench_main.py
+    python benchmarks/bench_main.py --sizes 100 1000 --check
+    python benchmarks/bench_main.py --update-baselines
+    python benchmarks/bench_main.py -- --resolver graphql --github-access-token x
+
+Reports the wall time, the number of requests per endpoint and the peak memory
+(maximum resident set size) of a `gen` run over the whole history, and compares
+them with the numbers stored in `baselines.json`. Each run is a separate process,
+with an empty cache. The arguments after `--` are passed to gen3git before the
+`gen` subcommand.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(BENCHMARKS_DIR, "baselines.json")
+
+
+def run_child(url, extra_args):
+    """
+    Run `gen3git.main` once in this process, and print the measurements as JSON.
+    """
+    sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+    import gen3git
+
+    argv = extra_args + [
+        "--repo",
+        "org/repo",
+        "--github-url",
+        url,
+        "--github-api-url",
+        url,
+        "--from-tag",
+        "1.0.0",
+        "gen",
+        "--to-tag",
+        "1.0.1",
+        "--markdown",
+    ]
+    args = gen3git.get_command_line_args(argv)
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        gen3git.main(args)
+    wall = time.perf_counter() - start
+    # kilobytes on Linux
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+    print(json.dumps({"wall_s": round(wall, 3), "peak_rss_mb": round(peak, 1)}))
+
+
+def run_size(commits, extra_args):
+    """
+    Benchmark a `gen` run over a fake repository of `commits` commits, tagged
+    1.0.0 on the first commit and 1.0.1 on the last one.
+    """
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCHMARKS_DIR, "fake_github.py"),
+            "--commits",
+            str(commits),
+            "--tag-every",
+            str(max(1, commits - 1)),
+        ],
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    try:
+        url = server.stdout.readline().strip()
+        workdir = tempfile.mkdtemp()
+        env = dict(os.environ, XDG_CACHE_HOME=os.path.join(workdir, "cache"))
+        env.pop("GH_TOKEN", None)
+        env.pop("GITHUB_TOKEN", None)
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), "--child", url, "--"]
+            + extra_args,
+            cwd=workdir,
+            env=env,
+            universal_newlines=True,
+        )
+        result = json.loads(output.strip().splitlines()[-1])
+        stats = requests.get(url + "/_stats").json()
+        result["requests"] = dict(sorted(stats["requests"].items()))
+        result["bytes"] = stats["bytes"]
+        return result
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def compare(size, result, baseline, tolerance):
+    """
+    Print the differences with the baseline, and return the regressions.
+    """
+    regressions = []
+    total = sum(result["requests"].values())
+    baseline_total = sum(baseline["requests"].values())
+    if total > baseline_total:
+        regressions.append("%s requests (baseline %s)" % (total, baseline_total))
+    for metric in ("wall_s", "peak_rss_mb"):
+        ratio = result[metric] / baseline[metric] if baseline[metric] else 1.0
+        print("  %-12s %8.2fx baseline" % (metric, ratio))
+        if ratio > 1 + tolerance:
+            regressions.append(
+                "%s %s (baseline %s)" % (metric, result[metric], baseline[metric])
+            )
+    print("  %-12s %+8d vs baseline" % ("requests", total - baseline_total))
+    return ["%s commits: %s" % (size, regression) for regression in regressions]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument(
+        "--baselines",
+        default=BASELINES,
+        help="JSON file of the baseline results. Default is benchmarks/baselines.json.",
+    )
+    parser.add_argument(
+        "--update-baselines",
+        action="store_true",
+        help="Store the results as the new baselines.",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Exit with an error if more requests are made than in the baselines, "
+        "or if the wall time or peak memory is over the tolerance.",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="Allowed wall time and peak memory increase, default is 0.25 (25%%).",
+    )
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("gen3git_args", nargs="*", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args.child, args.gen3git_args)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    results = {}
+    regressions = []
+    for size in args.sizes:
+        result = run_size(size, args.gen3git_args)
+        results[str(size)] = result
+        print(
+            "%6s commits %8.2f s %8.1f MB  %s requests  %s"
+            % (
+                size,
+                result["wall_s"],
+                result["peak_rss_mb"],
+                sum(result["requests"].values()),
+                ", ".join("%s=%s" % item for item in result["requests"].items()),
+            )
+        )
+        if str(size) in baselines:
+            regressions += compare(size, result, baselines[str(size)], args.tolerance)
+
+    if args.update_baselines:
+        baselines.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("Baselines saved into %s" % args.baselines)
+    if regressions:
+        print("Regressions:\n- %s" % "\n- ".join(regressions))
+        if args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
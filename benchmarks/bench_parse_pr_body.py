@@ -0,0 +1,181 @@
+"""
+Throughput benchmark of `gen3git.parse_pr_bodies` against the previous
+`parse_pr_body`/`parse_line` implementation, checking that both produce the
+same release notes.
+
+    python benchmarks/bench_parse_pr_body.py --bodies 20000
+    python benchmarks/bench_parse_pr_body.py --corpus recorded_bodies.json
+
+A recorded corpus is a JSON list of PR descriptions, e.g. the "body" of the
+pull requests listed by the GitHub API.
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gen3git import parse_pr_bodies  # noqa: E402
+
+SAMPLE_BODIES = [
+    """\
+Link to JIRA ticket if there is one: PXP-1234
+
+### New Features
+- Add the `/data/download` endpoint to get presigned URLs in bulk
+- Support the `GEN3_DEBUG` environment variable
+
+### Breaking Changes
+None
+
+### Bug Fixes
+* Fix the `expires_in` parameter being ignored for Google storage URLs
+
+### Improvements
+- Faster indexd lookups by caching the record aliases
+
+### Dependency updates
+- Bump `cdislogging` to 1.1.1
+
+### Deployment changes
+<!-- This section should only contain important things devops should know -->
+- The `FENCE_CONFIG` secret needs the new `DATA_DOWNLOAD` field
+""",
+    """\
+Please make sure to follow the [DEV guidelines](https://example.com/dev) before asking for review.
+
+### Improvements
+- Description about what this pull request does.
+- Implemented XXX
+- Use a connection pool for the database sessions
+
+[JIRA]: https://ctds-planx.atlassian.net/browse/PXP-1234
+""",
+    """\
+Bumps [urllib3](https://github.com/urllib3/urllib3) from 1.26.4 to 1.26.5.
+<details>
+<summary>Release notes</summary>
+</details>
+
+Dependabot commands and options
+You can trigger Dependabot actions by commenting on this PR
+""",
+    """\
+This pull request was generated automatically.
+
+### Bug Fixes
+- Do not crash when the manifest is empty
+""",
+    "",
+    None,
+]
+
+
+def reference_parse_pr_body(body, release_notes, ref, ref_type, repo_uri, link_type):
+    """
+    The previous `parse_pr_body` implementation, for comparison.
+    """
+    ref_link = "#{}".format(ref)
+    if repo_uri and ref_type == "pr":
+        if link_type == "markdown":
+            ref_link = "[#{}](https://github.com/{}/pull/{})".format(ref, repo_uri, ref)
+        elif link_type == "html":
+            ref_link = '<a href="https://github.com/{}/pull/{}">#{}</a>'.format(
+                repo_uri, ref, ref
+            )
+        elif link_type == "slack":
+            ref_link = "<https://github.com/{}/pull/{}|#{}>".format(repo_uri, ref, ref)
+        elif link_type == "text":
+            ref_link = "https://github.com/{}/pull/{}".format(repo_uri, ref)
+
+    category = "general updates"
+    if body:
+        if "Dependabot commands and options" in body:
+            category = "dependency updates"
+            for line in body.splitlines():
+                if line.startswith("Bumps"):
+                    release_notes.setdefault(category, []).append(
+                        "%s (#%s)" % (line, ref)
+                    )
+            return release_notes
+
+        for line in body.splitlines():
+            if line.startswith("### "):
+                category = line.replace("###", "").strip().lower()
+                if category not in release_notes:
+                    release_notes[category] = []
+            elif line:
+                line = reference_parse_line(line)
+                if line:
+                    release_notes[category].append("%s (%s)" % (line, ref_link))
+    return release_notes
+
+
+def reference_parse_line(line):
+    line = line.strip().lstrip("*").lstrip().lstrip("-").lstrip().lstrip("-").lstrip()
+    if (
+        "Please make sure to follow the [DEV guidelines]" in line
+        or line == "Description about what this pull request does."
+        or line == "Implemented XXX"
+        or line == "This pull request was generated automatically."
+        or line == "None"
+        or (line.startswith("<!--") and line.endswith("-->"))
+        or re.compile(r"^\[.*\]: http.*$").match(line)
+    ):
+        return None
+    return line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bodies", type=int, default=20000)
+    parser.add_argument("--corpus", help="JSON list of recorded PR descriptions.")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    corpus = SAMPLE_BODIES
+    if args.corpus:
+        with open(args.corpus) as f:
+            corpus = json.load(f)
+    desc_bodies = [
+        (i, "pr", corpus[i % len(corpus)]) for i in range(max(args.bodies, len(corpus)))
+    ]
+
+    def reference():
+        release_notes = {"general updates": []}
+        for ref, ref_type, body in desc_bodies:
+            reference_parse_pr_body(
+                body, release_notes, ref, ref_type, "uc-cdis/fence", "markdown"
+            )
+        return release_notes
+
+    def engine():
+        return parse_pr_bodies(
+            desc_bodies, repo_uri="uc-cdis/fence", link_type="markdown"
+        )
+
+    assert reference() == engine(), "the outputs are different"
+
+    results = {}
+    for name, function in (("reference", reference), ("parse_pr_bodies", engine)):
+        durations = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            function()
+            durations.append(time.perf_counter() - start)
+        results[name] = min(durations)
+        print(
+            "%-16s %8.1f ms  %10.0f bodies/s"
+            % (name, results[name] * 1000, len(desc_bodies) / results[name])
+        )
+    print(
+        "speedup          %8.2fx" % (results["reference"] / results["parse_pr_bodies"])
+    )
+
+
+if __name__ == "__main__":
+    main()
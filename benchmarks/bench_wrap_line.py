@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of `gen3git.wrap_line` against the previous recursive line
+wrapping, on long lines such as a pasted PR description.
+
+    python benchmarks/bench_wrap_line.py --words 10000
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gen3git import ReleaseNotes, wrap_line  # noqa: E402
+
+
+def recursive_breakup_line(line):
+    """
+    The previous `ReleaseNotes._breakup_line` implementation, for comparison.
+    """
+    break_value = 76
+    output = line
+    if len(line) > break_value:
+        output = ""
+        words = line.split()
+        total_length = 0
+        if ReleaseNotes._get_word_actual_len(words[0]) >= break_value:
+            output += words[0]
+            del words[0]
+        else:
+            while words and (
+                (total_length + ReleaseNotes._get_word_actual_len(words[0]))
+                < break_value
+            ):
+                total_length += ReleaseNotes._get_word_actual_len(words[0]) + 1
+                output += words[0] + " "
+                del words[0]
+        if words:
+            output += "\n    "
+            output += recursive_breakup_line(" ".join(words))
+    return output
+
+
+def get_line(words):
+    vocabulary = [
+        "the",
+        "release",
+        "notes",
+        "fix",
+        "([#1234](https://github.com/uc-cdis/fence/pull/1234))",
+        "configuration",
+        "a",
+    ]
+    random.seed(0)
+    return " ".join(random.choice(vocabulary) for _ in range(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    line = get_line(args.words)
+    # the recursive version recurses once per output line
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), args.words + 100))
+    assert wrap_line(line) == recursive_breakup_line(line)
+
+    results = {}
+    for name, function in (
+        ("recursive", recursive_breakup_line),
+        ("wrap_line", wrap_line),
+    ):
+        results[name] = (
+            min(timeit.repeat(lambda: function(line), number=1, repeat=args.repeat))
+            * 1000
+        )
+        print("%-10s %10.2f ms" % (name, results[name]))
+    print("speedup    %10.1fx" % (results["recursive"] / results["wrap_line"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Check that the startup of gen3git stays fast: for the import, `--help` and
+argument parsing, the heavy dependencies must not be imported, and the import
+time of gen3git reported by `python -X importtime` must be under the budget.
+
+    python benchmarks/check_import_time.py
+    python benchmarks/check_import_time.py --budget-ms 50
+
+Exits with an error if a check fails.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that are only needed to talk to GitHub or to the local clone
+HEAVY_MODULES = ["github", "git", "requests", "urllib3", "packaging", "pytz"]
+
+SCENARIOS = {
+    "import": "import gen3git",
+    "help": "import gen3git\n"
+    "try:\n"
+    "    gen3git.get_command_line_args(['--help'])\n"
+    "except SystemExit:\n"
+    "    pass",
+    "parse": "import gen3git\n"
+    "gen3git.get_command_line_args(['--repo', 'uc-cdis/fence', 'gen', '--markdown'])",
+}
+
+
+def get_import_times(code):
+    """
+    Run `code` in a new interpreter, and return the `{module: cumulative import
+    time in microseconds}` of its imports.
+    """
+    env = dict(os.environ)
+    # use the cached bytecode like an installed gen3git would
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            times[module.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=100,
+        help="Maximum import time of gen3git, default is 100 ms.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Number of runs of each scenario, the fastest one is used.",
+    )
+    args = parser.parse_args()
+
+    failures = []
+    for name, code in SCENARIOS.items():
+        runs = [get_import_times(code) for _ in range(args.repeat)]
+        import_time = min(times["gen3git"] for times in runs) / 1000.0
+        heavy = sorted(module for module in runs[0] if module in HEAVY_MODULES)
+        print(
+            "%-8s %8.1f ms  heavy modules imported: %s"
+            % (name, import_time, ", ".join(heavy) or "none")
+        )
+        if import_time > args.budget_ms:
+            failures.append(
+                "%s: gen3git import took %.1f ms (budget %s ms)"
+                % (name, import_time, args.budget_ms)
+            )
+        if heavy:
+            failures.append("%s: imported %s" % (name, ", ".join(heavy)))
+
+    if failures:
+        print("Failed:\n- %s" % "\n- ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,425 @@
+"""
+Local stand-in for the GitHub REST API, GraphQL API and website, serving a
+synthetic repository with a linear history. Used by `bench_main.py`, or on its
+own:
+
+    python benchmarks/fake_github.py --commits 1000 --tag-every 999
+
+prints the URL to use as `--github-url` and `--github-api-url` and serves until
+interrupted. `GET /_stats` returns the number of requests per endpoint.
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_EPOCH = datetime(2020, 1, 1)
+
+_PR_BODY = """\
+Link to JIRA ticket if there is one:
+
+### New Features
+- Feature number {n}, with a description long enough to need to be wrapped because it goes over the limit
+
+### Bug Fixes
+- Fixed bug {n}
+
+### Improvements
+- Improvement {n}
+
+### Dependency updates
+- Bumped library {n}
+"""
+
+
+class FakeRepository(object):
+    """
+    Synthetic repository of `commits` commits, newest first. Every fifth commit
+    has no PR, the other ones are merged from PR `i // 2 + 1`, and a tag
+    `1.0.<k>` is put on every `tag_every` commits. `open_pulls` maps commit SHAs
+    to the pull requests that contain them but are not merged.
+    """
+
+    def __init__(self, owner="org", name="repo", commits=100, tag_every=50):
+        self.owner = owner
+        self.name = name
+        self.full_name = "%s/%s" % (owner, name)
+        # index 0 is the oldest commit
+        self.commits = []
+        self.pulls = {}
+        for i in range(commits):
+            sha = "%040x" % (i + 1)
+            date = _EPOCH + timedelta(hours=i)
+            pr = None if i % 5 == 0 else i // 2 + 1
+            self.commits.append({"sha": sha, "date": date, "pr": pr, "index": i})
+            if pr and pr not in self.pulls:
+                self.pulls[pr] = {
+                    "number": pr,
+                    "body": _PR_BODY.format(n=pr),
+                    "merged_at": date,
+                    "updated_at": date,
+                }
+        self.by_sha = {commit["sha"]: commit for commit in self.commits}
+        self.open_pulls = {}
+        self.tags = []
+        for k, i in enumerate(range(0, commits, tag_every)):
+            self.tags.append(("1.0.%s" % k, self.commits[i]["sha"]))
+        # GitHub lists the most recent tags first
+        self.tags.reverse()
+
+    def get_sha(self, ref):
+        for name, sha in self.tags:
+            if name == ref:
+                return sha
+        if ref in self.by_sha:
+            return ref
+        return None
+
+
+def _iso(date):
+    return date.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_date(value):
+    return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+class FakeGitHub(object):
+    """
+    Serve `FakeRepository` instances over HTTP on localhost, and count the
+    requests per endpoint in `counts`, and per `Authorization` header in
+    `authorizations`. The API responses have an ETag, and the conditional
+    requests that match it get a 304, also counted per endpoint in
+    `not_modified`. If `rate_limit` is set to a `{"limit", "remaining", "reset"}`
+    dict, the REST API requests use it up and get the `X-RateLimit-*` headers,
+    and if `rate_limit_disabled` is set, `/rate_limit` is not found, like on a
+    GitHub Enterprise Server without rate limiting.
+    The compare API lists up to `compare_max_commits` commits, like GitHub's,
+    and the next `secondary_rate_limits` REST API requests get a secondary rate
+    limit 403 error, without `Retry-After`.
+    The number of commits of each GraphQL query is recorded in
+    `graphql_batches`, and if `graphql_errors` is set, the GraphQL queries fail
+    with these errors.
+    """
+
+    def __init__(self, repositories):
+        self.repositories = {repo.full_name: repo for repo in repositories}
+        self.counts = Counter()
+        self.not_modified = Counter()
+        self.authorizations = Counter()
+        self.graphql_batches = []
+        self.graphql_errors = None
+        self.rate_limit = None
+        self.rate_limit_disabled = False
+        self.compare_max_commits = 10000
+        self.secondary_rate_limits = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # the headers and the body are sent separately
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake.handle(self, "GET")
+
+            def do_POST(self):
+                fake.handle(self, "POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = "http://127.0.0.1:%s" % self.server.server_port
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request, method):
+        parsed = urlparse(request.path)
+        query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        body = None
+        if method == "POST":
+            length = int(request.headers.get("Content-Length") or 0)
+            body = json.loads(request.rfile.read(length) or "null")
+        endpoint, status, data, headers = self.route(method, parsed.path, query, body)
+        if endpoint != "_stats":
+            with self._lock:
+                self.counts[endpoint] += 1
+                self.authorizations[request.headers.get("Authorization")] += 1
+        if isinstance(data, str):
+            payload = data.encode()
+            content_type = "text/html; charset=utf-8"
+        else:
+            payload = json.dumps(data).encode()
+            content_type = "application/json; charset=utf-8"
+        headers = dict(headers or {})
+        if method == "GET" and status == 200 and not isinstance(data, str):
+            headers["ETag"] = '"%s"' % hashlib.md5(payload).hexdigest()
+            if request.headers.get("If-None-Match") == headers["ETag"]:
+                status = 304
+                payload = b""
+                with self._lock:
+                    self.not_modified[endpoint] += 1
+        with self._lock:
+            self.bytes_sent += len(payload)
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(payload)))
+        for key, value in headers.items():
+            request.send_header(key, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def route(self, method, path, query, body):
+        if path == "/_stats":
+            with self._lock:
+                stats = {"requests": dict(self.counts), "bytes": self.bytes_sent}
+            return "_stats", 200, stats, None
+        if method == "POST" and path.endswith("/graphql"):
+            return "graphql", 200, self.graphql(body), None
+        if path == "/rate_limit" and self.rate_limit_disabled:
+            return "rate_limit", 404, {"message": "Rate limiting is not enabled."}, None
+        if path == "/rate_limit":
+            now = {"limit": 5000, "remaining": 5000, "reset": 0, "used": 0}
+            with self._lock:
+                now.update(self.rate_limit or {})
+            return "rate_limit", 200, {"resources": {"core": now}, "rate": now}, None
+
+        match = re.match(r"^/([^/]+)/([^/]+)/branch_commits/([0-9a-f]+)$", path)
+        if match:
+            repo = self.repositories["%s/%s" % match.groups()[:2]]
+            commit = repo.by_sha[match.group(3)]
+            html = "<ul>"
+            if commit["pr"]:
+                html += '<li><a href="/%s/pull/%s">#%s</a></li>' % (
+                    repo.full_name,
+                    commit["pr"],
+                    commit["pr"],
+                )
+            return "branch_commits", 200, html + "</ul>", None
+
+        match = re.match(r"^/repos/([^/]+)/([^/]+)(/.*)?$", path)
+        if not match:
+            return "unknown", 404, {"message": "Not Found"}, None
+        repo = self.repositories.get("%s/%s" % match.groups()[:2])
+        if not repo:
+            return "unknown", 404, {"message": "Not Found"}, None
+        with self._lock:
+            limited = self.secondary_rate_limits > 0
+            self.secondary_rate_limits -= limited
+        if limited:
+            data = {
+                "message": "You have exceeded a secondary rate limit. Please wait "
+                "a few minutes before you try again.",
+                "documentation_url": "https://docs.github.com/rest",
+            }
+            return "secondary_rate_limit", 403, data, None
+        endpoint, status, data, headers = self.route_repo(repo, match.group(3), query)
+        with self._lock:
+            if self.rate_limit:
+                self.rate_limit["remaining"] = max(0, self.rate_limit["remaining"] - 1)
+                headers = dict(headers or {})
+                for key in ("limit", "remaining", "reset"):
+                    headers["X-RateLimit-" + key.title()] = str(self.rate_limit[key])
+        return endpoint, status, data, headers
+
+    def route_repo(self, repo, rest, query):
+        rest = rest or ""
+        base = "%s/repos/%s" % (self.url, repo.full_name)
+
+        if rest == "":
+            return "repo", 200, self.repo_json(repo), None
+        if rest == "/tags":
+            items = [
+                {
+                    "name": name,
+                    "commit": {"sha": sha, "url": "%s/commits/%s" % (base, sha)},
+                }
+                for name, sha in repo.tags
+            ]
+            return ("tags",) + self.paginate(base + "/tags", query, items)
+        if rest == "/commits":
+            commits = repo.commits
+            if "sha" in query:
+                sha = repo.get_sha(query["sha"])
+                commits = commits[: repo.by_sha[sha]["index"] + 1]
+            if "since" in query:
+                since = _parse_date(query["since"])
+                commits = [c for c in commits if c["date"] >= since]
+            if "until" in query:
+                until = _parse_date(query["until"])
+                commits = [c for c in commits if c["date"] <= until]
+            items = [self.commit_json(repo, c) for c in reversed(commits)]
+            return ("commits",) + self.paginate(base + "/commits", query, items)
+        match = re.match(r"^/commits/([^/]+)$", rest)
+        if match:
+            sha = repo.get_sha(match.group(1))
+            if not sha:
+                return "commit", 404, {"message": "Not Found"}, None
+            return "commit", 200, self.commit_json(repo, repo.by_sha[sha]), None
+        match = re.match(r"^/compare/(.+)\.\.\.(.+)$", rest)
+        if match:
+            start = repo.by_sha[repo.get_sha(match.group(1))]["index"]
+            stop = repo.by_sha[repo.get_sha(match.group(2))]["index"]
+            commits = repo.commits[start + 1 : stop + 1]
+            # only the oldest commits are listed
+            items = [
+                self.commit_json(repo, c) for c in commits[: self.compare_max_commits]
+            ]
+            headers, page = None, items
+            if "page" in query or "per_page" in query:
+                status, page, headers = self.paginate(
+                    "%s/compare/%s...%s" % (base, match.group(1), match.group(2)),
+                    query,
+                    items,
+                )
+            data = {
+                "url": "%s/compare/%s...%s" % (base, match.group(1), match.group(2)),
+                "status": "ahead",
+                "ahead_by": len(commits),
+                "behind_by": 0,
+                "total_commits": len(commits),
+                "commits": page,
+                "files": [],
+            }
+            return "compare", 200, data, headers
+        if rest == "/pulls":
+            pulls = sorted(
+                repo.pulls.values(), key=lambda pull: pull["updated_at"], reverse=True
+            )
+            items = [self.pull_json(repo, pull) for pull in pulls]
+            return ("pulls",) + self.paginate(base + "/pulls", query, items)
+        match = re.match(r"^/pulls/(\d+)$", rest)
+        if match:
+            pull = repo.pulls.get(int(match.group(1)))
+            if not pull:
+                return "pull", 404, {"message": "Not Found"}, None
+            return "pull", 200, self.pull_json(repo, pull), None
+        return "unknown", 404, {"message": "Not Found"}, None
+
+    def paginate(self, url, query, items):
+        per_page = int(query.get("per_page", 30))
+        page = int(query.get("page", 1))
+        last = max(1, -(-len(items) // per_page))
+        params = dict(query)
+        links = []
+        for rel, number in (("next", page + 1), ("last", last)):
+            if page < last:
+                params.update(page=number, per_page=per_page)
+                links.append(
+                    '<%s?%s>; rel="%s"'
+                    % (url, "&".join("%s=%s" % item for item in params.items()), rel)
+                )
+        headers = {"Link": ", ".join(links)} if links else None
+        return 200, items[(page - 1) * per_page : page * per_page], headers
+
+    def graphql(self, body):
+        name = body["variables"]["name"]
+        owner = body["variables"]["owner"]
+        repo = self.repositories["%s/%s" % (owner, name)]
+        objects = re.findall(r'(\w+): object\(oid: "([0-9a-f]+)"\)', body["query"])
+        with self._lock:
+            self.graphql_batches.append(len(objects))
+        if self.graphql_errors:
+            return {"data": None, "errors": self.graphql_errors}
+        result = {}
+        for alias, sha in objects:
+            commit = repo.by_sha.get(sha)
+            nodes = [
+                {
+                    "number": pull["number"],
+                    "body": pull["body"],
+                    "mergedAt": None,
+                    "updatedAt": _iso(pull["updated_at"]),
+                }
+                for pull in repo.open_pulls.get(sha, [])
+            ]
+            if commit and commit["pr"]:
+                pull = repo.pulls[commit["pr"]]
+                nodes.append(
+                    {
+                        "number": pull["number"],
+                        "body": pull["body"],
+                        "mergedAt": _iso(pull["merged_at"]),
+                        "updatedAt": _iso(pull["updated_at"]),
+                    }
+                )
+            result[alias] = {"associatedPullRequests": {"nodes": nodes}}
+        return {"data": {"repository": result}}
+
+    def repo_json(self, repo):
+        return {
+            "id": 1,
+            "name": repo.name,
+            "full_name": repo.full_name,
+            "owner": {"login": repo.owner},
+            "private": False,
+            "default_branch": "master",
+            "url": "%s/repos/%s" % (self.url, repo.full_name),
+        }
+
+    def commit_json(self, repo, commit):
+        message = "Commit %s" % commit["index"]
+        if commit["pr"]:
+            message = "Change %s (#%s)" % (commit["index"], commit["pr"])
+        return {
+            "sha": commit["sha"],
+            "url": "%s/repos/%s/commits/%s" % (self.url, repo.full_name, commit["sha"]),
+            "commit": {
+                "message": message,
+                "author": {"name": "dev", "date": _iso(commit["date"])},
+                "committer": {"name": "dev", "date": _iso(commit["date"])},
+            },
+            "parents": [],
+        }
+
+    def pull_json(self, repo, pull):
+        return {
+            "number": pull["number"],
+            "state": "closed",
+            "body": pull["body"],
+            "merged_at": _iso(pull["merged_at"]),
+            "updated_at": _iso(pull["updated_at"]),
+            "base": {"ref": "master"},
+            "url": "%s/repos/%s/pulls/%s" % (self.url, repo.full_name, pull["number"]),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--commits", type=int, default=100)
+    parser.add_argument("--tag-every", type=int, default=50)
+    args = parser.parse_args()
+
+    repo = FakeRepository(commits=args.commits, tag_every=args.tag_every)
+    fake = FakeGitHub([repo])
+    print(fake.url)
+    sys.stdout.flush()
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fake.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
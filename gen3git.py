@@ -4,38 +4,232 @@ to create release notes.
 """
 
 import argparse
+import bisect
+import contextlib
+import io
+import itertools
+import json
 import os
 import re
 import sys
+import threading
+import time
 
-import requests
-from datetime import datetime, timedelta
+from collections import Counter, deque, namedtuple
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-from git import Repo
-from github import Github
-from packaging.version import parse, Version, InvalidVersion
-import pytz
+from urllib.parse import urlparse
+
+# github, git, requests and packaging take a few hundred milliseconds to import:
+# they, and the standard modules only some commands need (concurrent.futures,
+# sqlite3, gzip), are imported by the code that uses them, so that `--help` and
+# the commands that do not need them start fast
 
 _GITHUB_REMOTE = re.compile(r"git@github.com:(.*).git|https://github.com/(.*).git")
 _GITHUB_PR = re.compile(r'href="[^"]+/pull/(\d+)"', re.DOTALL)
 _MARKDOWN_LINK = re.compile(r"^\(\[(.*)\]\(http.*\)$")
+_COMMIT_SHA = re.compile(r"^[0-9a-f]{40}$")
+_MERGE_SUBJECT = re.compile(r"^Merge pull request #(\d+) ")
+_SQUASH_SUBJECT = re.compile(r"\(#(\d+)\)$")
+_GITHUB_URL = "https://github.com"
+_GITHUB_API_URL = "https://api.github.com"
+
+_PER_PAGE = 100
+# number of commits the compare API lists at most
+_COMPARE_MAX_COMMITS = 10000
+# seconds to wait before retrying a request over a secondary rate limit
+_SECONDARY_RATE_LIMIT_WAIT = 60
+# number of commits resolved and parsed at a time
+_CHUNK_SIZE = 1000
+_CHECKPOINT_VERSION = 3
+_ARCHIVE_VERSION = 1
+_ARTIFACT_VERSION = 1
+
+PullRequest = namedtuple("PullRequest", ["body", "merged_at", "updated_at"])
+
+
+class ReleaseNotesError(Exception):
+    """
+    The release notes cannot be generated as specified, e.g. unknown tag.
+    """
+
+
+class DeadlineReached(ReleaseNotesError):
+    """
+    The `--deadline` of the run would be crossed by a wait, e.g. for the rate
+    limit reset or before retrying a request.
+    """
+
+
+def check_deadline(deadline_at, wait):
+    """
+    Raise `DeadlineReached` if waiting `wait` seconds from now would cross the
+    `deadline_at` time of `time.monotonic`, if any.
+    """
+    if deadline_at and time.monotonic() + wait > deadline_at:
+        raise DeadlineReached(
+            "Deadline reached, not waiting %ss for the rate limit" % int(wait)
+        )
+
+
+class Entry(namedtuple("Entry", ["line", "ref", "ref_type", "merged_at", "link"])):
+    """
+    A line of the release notes, parsed from the PR or commit `ref` of type
+    `ref_type` ("pr" or "commit") merged at `merged_at` (ISO 8601), if known.
+    The line ends with a link to the PR if `link`, else with its number: the
+    link is only built when the release notes are rendered, see
+    `ReleaseNotes.get_lines`.
+    """
+
+    __slots__ = ()
+
+
+def parse_github_date(value):
+    """
+    Return the timezone-aware UTC datetime of a GitHub date, e.g.
+    "2020-01-01T00:00:00Z", like the dates of PyGithub.
+    """
+    return datetime.strptime(value, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+
+
+def as_utc(date):
+    """
+    Return `date` as a timezone-aware datetime, assuming UTC if it is naive.
+    """
+    if date is not None and date.tzinfo is None:
+        return date.replace(tzinfo=timezone.utc)
+    return date
 
 
 def parse_version(name):
+    from packaging.version import parse, InvalidVersion
+
     try:
         return parse(name)
     except InvalidVersion:
         return name
 
 
+class TagIndex(object):
+    """
+    Index of the tags of a repository, built from a single listing of the tags.
+
+    Maps tag names to tags and commit SHAs to tag names (in listing order), and
+    keeps the semantic version tags sorted by version.
+    """
+
+    def __init__(self, tags):
+        from packaging.version import Version
+
+        self.tags = []
+        self._by_name = {}
+        self._by_sha = {}
+        versions = []
+        for tag in tags:
+            self.tags.append(tag)
+            self._by_name.setdefault(tag.name, tag)
+            self._by_sha.setdefault(tag.commit.sha, []).append(tag.name)
+            ver = parse_version(tag.name)
+            # ignore non-semantic tags
+            if isinstance(ver, Version):
+                versions.append((ver, tag.name))
+        versions.sort()
+        self.versions = [ver for ver, _ in versions]
+        self.version_names = [name for _, name in versions]
+
+    def get(self, name):
+        return self._by_name.get(name)
+
+    def get_names(self, sha):
+        return self._by_sha.get(sha, [])
+
+    def get_previous(self, name=None):
+        """
+        Return the tag with the greatest version lower than the version of tag
+        `name`, or the greatest version overall if `name` is not specified. If
+        there is no such tag, fall back to the first non-semantic tag other than
+        `name`, if any.
+        """
+        from packaging.version import Version
+
+        upper_bound = parse_version(name) if name else None
+        if isinstance(upper_bound, Version):
+            i = bisect.bisect_left(self.versions, upper_bound)
+        else:
+            i = len(self.versions)
+        if i:
+            return self._by_name[self.version_names[i - 1]]
+        for tag in self.tags:
+            if tag.name != name and not isinstance(parse_version(tag.name), Version):
+                return tag
+        return None
+
+
 class ReleaseNotes(object):
     class ExportType(Enum):
         TEXT = 0
         HTML = 1
         MARKDOWN = 2
+        SLACK = 3
 
-    def __init__(self, release_notes):
+    def __init__(
+        self,
+        release_notes,
+        width=76,
+        repo_uri=None,
+        link_type=None,
+        github_url=_GITHUB_URL,
+    ):
+        # `{category: [line]}`, where a line is a string or an `Entry`, whose
+        # link to the PR is built for the `repo_uri` repository on the
+        # `github_url` website: if `link_type` is set, with the link type of
+        # each export type, see `_LINK_TYPES`
         self.release_notes = release_notes
+        # lines are wrapped under `width` chars, or not at all if 0
+        self.width = width
+        self.repo_uri = repo_uri
+        self.link_type = link_type
+        self.github_url = github_url
+
+    # what to write for each export type, around the title/additional text header
+    _TEMPLATES = {
+        ExportType.TEXT: {
+            "section": "{}\n",
+            "item": "  - {}\n",
+            "section_end": "\n",
+            "footer_text": "{}\n",
+            "footer": "",
+        },
+        ExportType.HTML: {
+            "section": "<h2>{}</h2>\n<ul>\n",
+            "item": "<li>{}</li>\n",
+            "section_end": "</ul>\n",
+            "footer_text": "<p>{}</p>\n",
+            "footer": "</body></html>\n",
+        },
+        ExportType.MARKDOWN: {
+            "section": "## {}\n",
+            "item": "  - {}\n",
+            "section_end": "\n",
+            "footer_text": "_{}_\n",
+            "footer": "",
+        },
+        ExportType.SLACK: {
+            "section": "*{}*\n",
+            "item": "\u2022 {}\n",
+            "section_end": "\n",
+            "footer_text": "_{}_\n",
+            "footer": "",
+        },
+    }
+
+    # the type of the PR links in each export type, see `get_ref_link`
+    _LINK_TYPES = {
+        ExportType.TEXT: "text",
+        ExportType.HTML: "html",
+        ExportType.MARKDOWN: "markdown",
+        ExportType.SLACK: "slack",
+    }
 
     def export(
         self,
@@ -43,16 +237,15 @@ class ReleaseNotes(object):
         file=None,
         title_text="Release Notes",
         additional_text="",
+        footer_text="",
     ):
-        if type_ == ReleaseNotes.ExportType.TEXT:
-            output = self._get_txt_output(title_text, additional_text)
-        elif type_ == ReleaseNotes.ExportType.HTML:
-            output = self._get_html_output(title_text, additional_text)
-        elif type_ == ReleaseNotes.ExportType.MARKDOWN:
-            output = self._get_markdown_output(title_text, additional_text)
-        else:
+        if type_ not in ReleaseNotes._TEMPLATES:
             raise NotImplementedError()
 
+        output = io.StringIO()
+        self.write({type_: output}, title_text, additional_text, footer_text)
+        output = output.getvalue()
+
         if file:
             full_path = os.path.abspath(file)
             print("Exporting release notes into file:\n{}\n".format(full_path))
@@ -61,60 +254,90 @@ class ReleaseNotes(object):
 
         return output
 
-    def _get_txt_output(self, title_text, additional_text):
-        output = ""
-
-        output += title_text + "\n\n"
-        output += additional_text + "\n\n"
-        for key, values in self.release_notes.items():
-            # ignore items placed in the general description and just get following
-            # sections. Don't include section if empty
-            if key != "general updates" and values:
-                output += key.title() + "\n"
-                for value in values:
-                    output += "  - "
-                    output += ReleaseNotes._breakup_line(value)
-                    output += "\n"
-                output += "\n"
-        return output
-
-    def _get_html_output(self, title_text, additional_text):
-        output = ""
+    def write(
+        self, sinks, title_text="Release Notes", additional_text="", footer_text=""
+    ):
+        """
+        Write the release notes to file-like objects: `sinks` is a
+        `{ExportType: file}` dict. The `Entry` lines are linked and wrapped once
+        for all the export types with the same link type, in a single pass over
+        the release notes per link type. The `footer_text`, if any, is written
+        after the sections.
+        """
+        for type_ in sinks:
+            if type_ not in ReleaseNotes._TEMPLATES:
+                raise NotImplementedError()
+        for type_, sink in sinks.items():
+            sink.write(ReleaseNotes._get_header(type_, title_text, additional_text))
+        # `{link type: [(sink, template)]}`
+        link_types = {}
+        for type_, sink in sinks.items():
+            link_type = self.link_type and ReleaseNotes._LINK_TYPES[type_]
+            link_types.setdefault(link_type, []).append(
+                (sink, ReleaseNotes._TEMPLATES[type_])
+            )
+        sinks = [sink for group in link_types.values() for sink in group]
 
-        output += "<html>\n<head>\n</head>\n<body>\n"
-        output += "<h1>{}</h1>\n".format(title_text)
-        output += "<div>\n"
-        for line in additional_text.split("\n"):
-            output += "<p>{}</p>\n".format(line)
-        output += "</div>\n"
         for key, values in self.release_notes.items():
             # ignore items placed in the general description and just get following
             # sections. Don't include section if empty
             if key != "general updates" and values:
-                output += "<h2>" + key.title() + "</h2>\n<ul>\n"
-                for value in values:
-                    output += "<li>"
-                    output += ReleaseNotes._breakup_line(value)
-                    output += "</li>\n"
-                output += "</ul>\n"
-        output += "</body></html>\n"
-        return output
-
-    def _get_markdown_output(self, title_text, additional_text):
-        output = ""
+                for sink, template in sinks:
+                    sink.write(template["section"].format(key.title()))
+                for link_type, group in link_types.items():
+                    for value in self.get_lines(values, link_type):
+                        line = wrap_line(value, self.width) if self.width else value
+                        for sink, template in group:
+                            sink.write(template["item"].format(line))
+                for sink, template in sinks:
+                    sink.write(template["section_end"])
+        for sink, template in sinks:
+            if footer_text:
+                sink.write(template["footer_text"].format(footer_text))
+            sink.write(template["footer"])
+
+    def get_lines(self, values, link_type=None):
+        """
+        Yield the lines of a category: the strings as is, and the `Entry`s
+        formatted with `link_type` links. The link of a PR is built once for its
+        consecutive lines.
+        """
+        ref = ref_link = None
+        for value in values:
+            if isinstance(value, Entry):
+                if not value.link:
+                    value = "%s (#%s)" % (value.line, value.ref)
+                else:
+                    if (value.ref, value.ref_type) != ref:
+                        ref = (value.ref, value.ref_type)
+                        ref_link = get_ref_link(
+                            value.ref,
+                            value.ref_type,
+                            self.repo_uri,
+                            link_type,
+                            self.github_url,
+                        )
+                    value = "%s (%s)" % (value.line, ref_link)
+            yield value
 
-        output += "# {}\n\n".format(title_text)
-        output += additional_text.replace("\n", "\n\n") + "\n\n"
-        for key, values in self.release_notes.items():
-            # ignore items placed in the general description and just get following
-            # sections. Don't include section if empty
-            if key != "general updates" and values:
-                output += "## " + key.title() + "\n"
-                for value in values:
-                    output += "  - "
-                    output += ReleaseNotes._breakup_line(value)
-                    output += "\n"
-                output += "\n"
+    @staticmethod
+    def _get_header(type_, title_text, additional_text):
+        if type_ == ReleaseNotes.ExportType.HTML:
+            output = "<html>\n<head>\n</head>\n<body>\n"
+            output += "<h1>{}</h1>\n".format(title_text)
+            output += "<div>\n"
+            for line in additional_text.split("\n"):
+                output += "<p>{}</p>\n".format(line)
+            output += "</div>\n"
+        elif type_ == ReleaseNotes.ExportType.SLACK:
+            output = "*{}*\n\n".format(title_text)
+            output += additional_text + "\n\n"
+        elif type_ == ReleaseNotes.ExportType.MARKDOWN:
+            output = "# {}\n\n".format(title_text)
+            output += additional_text.replace("\n", "\n\n") + "\n\n"
+        else:
+            output = title_text + "\n\n"
+            output += additional_text + "\n\n"
         return output
 
     @staticmethod
@@ -138,38 +361,192 @@ class ReleaseNotes(object):
           - this is a long line that we should probably break up into much smaller
             pieces so that's what this does. cool.
         """
-        break_value = 76
-        output = line
-        if len(line) > break_value:
-            output = ""
-            words = line.split()
-            total_length = 0
+        return wrap_line(line)
 
-            # given a list of words, keep trying to add another word without going over
-            # 76 chars. if a single word is longer than 76 chars, add it anyway
-            if ReleaseNotes._get_word_actual_len(words[0]) >= break_value:
-                output += words[0]
-                del words[0]
-            else:
-                while words and (
-                    (total_length + ReleaseNotes._get_word_actual_len(words[0]))
-                    < break_value
-                ):
-                    # 1 for space
-                    total_length += ReleaseNotes._get_word_actual_len(words[0]) + 1
-                    output += words[0] + " "
-                    del words[0]
 
-            # hit 76 char limit or used all the words.
-            # more words? new line and call this function recursively to continue breaking into chunks
-            if words:
-                output += "\n    "
-                output += ReleaseNotes._breakup_line(" ".join(words))
+# export type and file extension of each output type
+_EXPORT_TYPES = {
+    "markdown": (ReleaseNotes.ExportType.MARKDOWN, ".md"),
+    "html": (ReleaseNotes.ExportType.HTML, ".html"),
+    "text": (ReleaseNotes.ExportType.TEXT, ".txt"),
+    "slack": (ReleaseNotes.ExportType.SLACK, ".slack"),
+}
+
+_ADDITIONAL_TEXT = """\
+For: {}
+Notes since tag: {}
+Notes to tag/commit: {}
+Generated: {}
+"""
+
+
+def wrap_line(line, width=76):
+    """
+    Break up a line into lines shorter than `width` chars, joined by a newline and
+    a 4 spaces indent. Markdown links in parentheses only count for the length of
+    their text. A word longer than `width` chars gets a line of its own.
+
+    Lines up to `width` chars are returned as is.
+    """
+    if len(line) <= width:
+        return line
+
+    words = line.split()
+    word_lens = [ReleaseNotes._get_word_actual_len(word) for word in words]
+    # length of the rest of the line once joined back with single spaces
+    remaining_len = sum(len(word) for word in words) + len(words) - 1
+    chunks = []
+    i = 0
+    while True:
+        start = i
+        if word_lens[i] >= width:
+            chunk = words[i]
+            i += 1
+        else:
+            # given a list of words, keep adding words without going over `width`
+            total_length = 0
+            while i < len(words) and total_length + word_lens[i] < width:
+                # 1 for space
+                total_length += word_lens[i] + 1
+                i += 1
+            chunk = " ".join(words[start:i]) + " "
+        chunks.append(chunk)
+        if i == len(words):
+            break
+
+        # hit the limit. no need to break up the rest if it is short enough
+        remaining_len -= sum(len(word) + 1 for word in words[start:i])
+        if remaining_len <= width:
+            chunks.append(" ".join(words[i:]))
+            break
+
+    return "\n    ".join(chunks)
+
+
+class SpillList(object):
+    """
+    Append-only list of strings that keeps at most `max_items` of them in
+    memory: the older ones are spilled to a temporary file, and read back when
+    iterating. Items that are not JSON types, such as an `Entry`, are spilled
+    as JSON and read back with `load`, e.g. `Entry._make`.
+    """
+
+    def __init__(self, items=(), max_items=1000, load=None):
+        self.max_items = max_items
+        self.load = load
+        self._items = []
+        self._file = None
+        self._spilled = 0
+        self.extend(items)
+
+    def append(self, item):
+        self._items.append(item)
+        if len(self._items) >= self.max_items:
+            self._spill()
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def _spill(self):
+        if not self._file:
+            import tempfile
+
+            self._file = tempfile.TemporaryFile("w+", encoding="utf-8")
+        # one JSON string per line, in case an item has line breaks
+        self._file.writelines(json.dumps(item) + "\n" for item in self._items)
+        self._spilled += len(self._items)
+        self._items = []
+
+    def __iter__(self):
+        if self._file:
+            self._file.seek(0)
+            for _ in range(self._spilled):
+                item = json.loads(self._file.readline())
+                yield self.load(item) if self.load else item
+            self._file.seek(0, os.SEEK_END)
+        for item in self._items:
+            yield item
+
+    def __len__(self):
+        return self._spilled + len(self._items)
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+
+class SpilledCategories(dict):
+    """
+    Release notes dict (`{category: [line]}`) whose lists are `SpillList`s, so
+    that it can be filled by `parse_pr_bodies` or `parse_pr_entries` and
+    rendered by `ReleaseNotes` with a bounded memory use.
+    """
+
+    def __init__(self, items=(), max_items=1000, load=None):
+        super(SpilledCategories, self).__init__()
+        self.max_items = max_items
+        self.load = load
+        for key, values in dict(items).items():
+            self[key] = values
+
+    def __setitem__(self, key, values):
+        if not isinstance(values, SpillList):
+            values = SpillList(values, self.max_items, self.load)
+        super(SpilledCategories, self).__setitem__(key, values)
+
+    def setdefault(self, key, default=()):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def close(self):
+        for values in self.values():
+            values.close()
+
+
+def dump_json(obj, f, separators=None):
+    """
+    Write `obj` into the `f` file as JSON, like `json.dump`, except that the
+    `SpillList`s of its dicts are written an item at a time instead of being
+    loaded in memory.
+    """
+    item_separator, key_separator = separators or (", ", ": ")
+    if isinstance(obj, SpillList):
+        f.write("[")
+        for i, item in enumerate(obj):
+            if i:
+                f.write(item_separator)
+            json.dump(item, f, separators=separators)
+        f.write("]")
+    elif isinstance(obj, dict):
+        f.write("{")
+        for i, (key, value) in enumerate(obj.items()):
+            if i:
+                f.write(item_separator)
+            f.write(json.dumps(str(key)) + key_separator)
+            dump_json(value, f, separators)
+        f.write("}")
+    else:
+        json.dump(obj, f, separators=separators)
 
-        return output
 
+def iter_chunks(items, size):
+    """
+    Yield the items of the `items` iterable in lists of `size` items.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
-def get_command_line_args():
+
+def get_command_line_args(argv=None):
     parser = argparse.ArgumentParser(description="Create release notes")
     subs = parser.add_subparsers()
     gen = subs.add_parser("gen", help="Generate release notes only.")
@@ -211,6 +588,18 @@ def get_command_line_args():
         help="Name for file to export to. Don't include extension. Default is "
         '"release_notes".',
     )
+    gen.add_argument(
+        "--artifact",
+        type=str,
+        help="Also save the parsed release notes into this JSON file, to render them "
+        "again in any format with `gen3git render`, without fetching anything.",
+    )
+    gen.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Save a checkpoint next to the output file, and on the next runs only "
+        "process the commits that are more recent than the checkpoint.",
+    )
     gen.add_argument(
         "--text",
         action="store_const",
@@ -229,6 +618,107 @@ def get_command_line_args():
         const=True,
         help="Output an html file with release notes.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=8,
+        help="Number of concurrent requests to use when looking up the pull "
+        "requests of the commits. Default is 8.",
+    )
+    parser.add_argument(
+        "--resolver",
+        choices=["scrape", "graphql"],
+        default="scrape",
+        help='How to find the pull requests of the commits: "scrape" looks up each '
+        'commit on GitHub\'s website, "graphql" uses batched GitHub GraphQL API '
+        "queries and requires an access token. Default is scrape.",
+    )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="List the commits from the local clone (`git rev-list FROM..TO`) "
+        "instead of the GitHub API, and get the PR numbers of merge and squash "
+        "commits from their subject. The tags must be fetched locally.",
+    )
+    parser.add_argument(
+        "--parse-rules",
+        type=str,
+        help="JSON file with additional rules to parse the PR descriptions: "
+        '"skip_lines", "skip_contains" and "skip_patterns" lists of lines to '
+        'ignore, and "bots" (e.g. {"Dependabot commands and options": '
+        '{"category": "dependency updates", "prefix": "Bumps"}}).',
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the local cache of the commits' pull requests "
+        "(under $XDG_CACHE_HOME/gen3git or ~/.cache/gen3git).",
+    )
+    parser.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="Fetch the commits' pull requests again and overwrite the local cache.",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        metavar="SECONDS",
+        help="Stop resolving commits after this many seconds, and write the release "
+        'notes of the commits resolved so far, with a "N commits unresolved" '
+        "footer. The most recent commits are resolved first, and the waits for the "
+        "rate limit do not cross the deadline either. With gen --incremental, and "
+        "with release, the next run resolves the other ones. Not available with "
+        "tag.",
+    )
+    parser.add_argument(
+        "--prefetch-pulls",
+        action="store_true",
+        help="List the pull requests merged into the default branch since the start "
+        "of the range, 100 per request, instead of getting the pull requests of the "
+        "commits one by one. The others are still fetched one by one.",
+    )
+    parser.add_argument(
+        "--record",
+        type=str,
+        metavar="ARCHIVE",
+        help="Save every GitHub response of the run into this gzipped JSON archive, "
+        "to generate the notes again later with --replay. The local cache is not "
+        "used.",
+    )
+    parser.add_argument(
+        "--replay",
+        type=str,
+        metavar="ARCHIVE",
+        help="Answer the GitHub requests from an archive saved with --record instead "
+        "of the network, e.g. to generate the same notes in another format.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Record the duration of each phase, and count the HTTP requests per "
+        "endpoint, the cache hits, the retries and the bytes received. The report "
+        "is printed as JSON at the end.",
+    )
+    parser.add_argument(
+        "--trace-file",
+        type=str,
+        help="Write the --profile JSON report to this file instead (implies "
+        "--profile).",
+    )
+    parser.add_argument(
+        "--github-url",
+        type=str,
+        default=os.environ.get("GITHUB_SERVER_URL", _GITHUB_URL),
+        help="URL of the GitHub website, default is GITHUB_SERVER_URL or "
+        "https://github.com.",
+    )
+    parser.add_argument(
+        "--github-api-url",
+        type=str,
+        default=os.environ.get("GITHUB_API_URL", _GITHUB_API_URL),
+        help="URL of the GitHub API, default is GITHUB_API_URL or "
+        "https://api.github.com.",
+    )
     parser.add_argument(
         "--github-access-token",
         type=str,
@@ -248,125 +738,437 @@ def get_command_line_args():
         default=os.getenv("TRAVIS_TAG"),
     )
 
-    args = parser.parse_args()
+    batch = subs.add_parser(
+        "batch",
+        help="Generate release notes for several repositories in one process.",
+    )
+    batch.add_argument(
+        "manifest",
+        help='JSON file with a list of objects with a "repo" key and any other '
+        '"gen" option, e.g. [{"repo": "uc-cdis/fence", "from_tag": "1.0.0", '
+        '"to_tag": "1.1.0", "markdown": true}]. Default "file_name" is '
+        '"<repo name>_release_notes".',
+    )
+
+    backfill = subs.add_parser(
+        "backfill",
+        help="Generate the release notes of every release at once: one file per "
+        "tag, with the changes since the previous version.",
+    )
+    backfill.add_argument(
+        "--to-tag",
+        type=str,
+        help="Last release to generate the notes of, default is the greatest "
+        "version. The first one is the version after --from-tag, default is the "
+        "version after the lowest one.",
+    )
+    backfill.add_argument(
+        "--output-dir",
+        type=str,
+        default=".",
+        help='Directory to write the "<tag>.<extension>" files into, default is the '
+        "current directory.",
+    )
+    backfill.add_argument(
+        "--text",
+        action="store_const",
+        const=True,
+        help="Output text files with release notes (default).",
+    )
+    backfill.add_argument(
+        "--markdown",
+        action="store_const",
+        const=True,
+        help="Output markdown files with release notes.",
+    )
+    backfill.add_argument(
+        "--html",
+        action="store_const",
+        const=True,
+        help="Output html files with release notes.",
+    )
+
+    render = subs.add_parser(
+        "render",
+        help="Render the release notes saved by `gen --artifact`, without fetching "
+        "anything.",
+    )
+    render.add_argument("artifact_file", metavar="ARTIFACT", help="The artifact.")
+    render.add_argument(
+        "--file-name",
+        type=str,
+        help="Name for file to export to. Don't include extension. Default is to "
+        "print the release notes.",
+    )
+    render.add_argument(
+        "--width",
+        type=int,
+        help="Wrap the lines under this number of characters, 0 not to wrap them. "
+        "Default is 76, or 0 for --slack.",
+    )
+    for type_ in ("text", "markdown", "html", "slack"):
+        render.add_argument(
+            "--" + type_,
+            action="store_const",
+            const=True,
+            help="Output %s release notes." % type_,
+        )
+
+    serve = subs.add_parser(
+        "serve",
+        help="Run an HTTP service that renders release notes from in-memory "
+        "caches, kept up to date by GitHub webhooks.",
+    )
+    serve.add_argument(
+        "--host", type=str, default="127.0.0.1", help="Default is 127.0.0.1."
+    )
+    serve.add_argument("--port", type=int, default=8080, help="Default is 8080.")
+    serve.add_argument(
+        "--webhook-secret",
+        type=str,
+        default=os.environ.get("GEN3GIT_WEBHOOK_SECRET"),
+        help="Secret of the GitHub webhooks, to check their signature. Default is "
+        "GEN3GIT_WEBHOOK_SECRET. Required unless --host is a loopback address, "
+        "where the signatures are not checked without it.",
+    )
+
+    args = parser.parse_args(argv)
     return args
 
 
-def main(args=None):
+def get_graphql_url(api_url):
+    """
+    Return the URL of the GraphQL API of the GitHub instance of the REST API
+    `api_url`: https://api.github.com/graphql, or <host>/api/graphql for
+    GitHub Enterprise Server, whose REST API is at <host>/api/v3.
+    """
+    api_url = api_url.rstrip("/")
+    if api_url.endswith("/api/v3"):
+        return api_url[: -len("/v3")] + "/graphql"
+    return api_url + "/graphql"
+
+
+def get_github_client(token=None, base_url=_GITHUB_API_URL):
+    from github import Github
+
+    # list with the maximum page size. The reads are throttled by
+    # `GitHubSession` according to the rate limit, instead of PyGithub's fixed
+    # delay between requests, which would serialize the concurrent requests
+    kwargs = dict(base_url=base_url, per_page=_PER_PAGE, seconds_between_requests=None)
+    if token:
+        return Github(token, **kwargs)
+    print(
+        "Warning: No GitHub access token, might run into rate limits. Use --github-access-token or set the enviroment variable GH_TOKEN or GITHUB_TOKEN to set a token."
+    )
+    return Github(**kwargs)
+
+
+def iter_pages(items, jobs=1, per_page=_PER_PAGE):
+    """
+    Iterate over the elements of a PyGithub `PaginatedList` in order, fetching
+    the pages concurrently. The number of elements (from the `Link` header of
+    a one-element request) is fetched along with the first page, then the
+    other pages are fetched `jobs` at a time.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    jobs = max(1, jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        total = executor.submit(lambda: items.totalCount)
+        first = executor.submit(items.get_page, 0)
+        for element in first.result():
+            yield element
+        pages = -(-total.result() // per_page)
+        pending = deque()
+        next_page = 1
+        while next_page < pages or pending:
+            while next_page < pages and len(pending) < jobs:
+                pending.append(executor.submit(items.get_page, next_page))
+                next_page += 1
+            for element in pending.popleft().result():
+                yield element
+
+
+def iter_compared_commits(comparison, jobs=1, per_page=_PER_PAGE):
+    """
+    Iterate over the commits of a PyGithub `Comparison`, i.e. the commits of its
+    head that are not in its base, from the most recent one. The API lists them
+    from the oldest one: the first page comes with the number of commits, then
+    the other pages are fetched from the last one, `jobs` at a time.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    jobs = max(1, jobs)
+    commits = comparison.commits
+    pages = -(-comparison.total_commits // per_page)
+    # the first page is the one fetched with the comparison
+    first = list(itertools.islice(commits, per_page))
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        next_page = pages - 1
+        while next_page > 0 or pending:
+            while next_page > 0 and len(pending) < jobs:
+                pending.append(executor.submit(commits.get_page, next_page))
+                next_page -= 1
+            for element in reversed(pending.popleft().result()):
+                yield element
+    for element in reversed(first):
+        yield element
+
+
+def iter_range_commits(repo, base_sha, head_sha, since, jobs=1):
+    """
+    Return the number of commits of `head_sha` that are not in `base_sha`, and
+    an iterator over them from the most recent one, see `iter_compared_commits`.
+    The compare API only lists the first `_COMPARE_MAX_COMMITS` commits: above
+    that, the commits of `head_sha` since `since`, the date of `base_sha`, are
+    listed instead, until `base_sha`.
+    """
+    comparison = repo.compare(base_sha, head_sha)
+    if comparison.total_commits <= _COMPARE_MAX_COMMITS:
+        return comparison.total_commits, iter_compared_commits(comparison, jobs)
+    print(
+        "%s commits in the range, more than the %s of the compare API: listing "
+        "the commits since %s instead"
+        % (comparison.total_commits, _COMPARE_MAX_COMMITS, since)
+    )
+    commits = iter_pages(repo.get_commits(sha=head_sha, since=since), jobs)
+    return comparison.total_commits, itertools.takewhile(
+        lambda commit: commit.sha != base_sha, commits
+    )
+
+
+def main(args=None, transport=None):
+    """
+    Run the gen3git command of `args`, the command line arguments by default.
+    All the HTTP requests are sent with the `transport` `requests.Session` if
+    any, e.g. to point gen3git at a local stand-in server. Exit with status 1
+    if the release notes cannot be generated.
+    """
     if args is None:
         args = get_command_line_args()
-    if args.github_access_token:
-        g = Github(args.github_access_token)
+    if hasattr(args, "artifact_file"):
+        return render_artifact(args)
+    if hasattr(args, "manifest"):
+        return run_batch(args, transport)
+    if hasattr(args, "webhook_secret"):
+        return run_service(args, transport)
+    if hasattr(args, "output_dir"):
+        generate = backfill_release_notes
     else:
-        print(
-            "Warning: No GitHub access token, might run into rate limits. Use --github-access-token or set the enviroment variable GH_TOKEN or GITHUB_TOKEN to set a token."
+        generate = generate_release_notes
+
+    profiler = get_profiler(args)
+    archive = get_archive(args)
+    cache = None if args.no_cache or archive else ResolverCache()
+    try:
+        session = GitHubSession(
+            jobs=args.jobs,
+            etags=None if args.refresh_cache else cache,
+            api_url=args.github_api_url,
+            profiler=profiler,
+            archive=archive,
+            transport=transport,
+        )
+        g = get_github_client(args.github_access_token, args.github_api_url)
+        session.attach(g)
+        return generate(args, g, session, cache)
+    except ReleaseNotesError as e:
+        print(e)
+        sys.exit(1)
+    finally:
+        if cache:
+            cache.close()
+        if archive:
+            archive.save()
+        profiler.save(args.trace_file)
+
+
+def get_repo_uri(args):
+    """
+    Return the "owner/repo" identifier of the `--repo` option, or of the remote
+    of the current branch of the local repository. Raise a `ReleaseNotesError`
+    if not found.
+    """
+    if args.repo:
+        return args.repo
+
+    from git import Repo
+
+    git = Repo(search_parent_directories=True)
+    tracking_branch = git.active_branch.tracking_branch()
+    if not tracking_branch:
+        raise ReleaseNotesError(
+            "No remote URL found for current branch, please specify --repo manually."
+        )
+    uri = list(git.remote(tracking_branch.remote_name).urls)
+    if len(uri) == 1:
+        uri = uri[0]
+    else:
+        raise ReleaseNotesError("Multiple URL found, please manually specify.")
+
+    matches = _GITHUB_REMOTE.findall(uri)
+    if not matches:
+        raise ReleaseNotesError(
+            f"Unable to match remote uri {uri} to regex `{_GITHUB_REMOTE}`"
+        )
+    return "".join(matches[0])
+
+
+def get_resolver(args, repo, uri, session, cache=None, since=None, tagged=False):
+    """
+    Return the resolver selected by `--resolver`, cached by the `ResolverCache`
+    or `MemoryResolverCache` if any. Raise a `ReleaseNotesError` if it cannot be
+    used. `tagged` is whether the commits resolved are all in a tag.
+
+    With `--prefetch-pulls`, the pull requests merged since the `since` date are
+    listed first, see `prefetch_pulls`, and take precedence over the cache.
+    """
+    if args.resolver == "graphql":
+        if not args.github_access_token:
+            raise ReleaseNotesError(
+                "The GraphQL resolver requires a GitHub access token."
+            )
+        resolver = GraphQLResolver(
+            repo,
+            uri,
+            args.github_access_token,
+            jobs=args.jobs,
+            session=session,
+            graphql_url=get_graphql_url(args.github_api_url),
+        )
+    else:
+        resolver = BranchCommitsResolver(
+            repo, uri, jobs=args.jobs, session=session, github_url=args.github_url
+        )
+    if cache:
+        resolver = CachedResolver(
+            resolver,
+            cache,
+            refresh=args.refresh_cache,
+            profiler=session.profiler,
+            # the webhooks keep the pull requests of `gen3git serve` up to date,
+            # see `ReleaseNotesService`
+            repo=None if isinstance(cache, MemoryResolverCache) else repo,
+            cache_empty=tagged,
         )
-        g = Github()
+    if getattr(args, "prefetch_pulls", False) and since:
+        # in front of the cache: the prefetched pull requests are the most
+        # recent versions
+        resolver = PrefetchedResolver(
+            resolver,
+            prefetch_pulls(repo, since, profiler=session.profiler),
+            profiler=session.profiler,
+        )
+    return resolver
+
 
+def check_public_repo(args, uri, session):
+    """
+    Raise an exception if the repository is private.
+    """
     headers = {}
     if args.github_access_token:
         headers = {"Authorization": f"token {args.github_access_token}"}
 
-    # Get GitHub Repository
-    if args.repo:
-        uri = args.repo
-    else:
-        git = Repo(search_parent_directories=True)
-        tracking_branch = git.active_branch.tracking_branch()
-        if not tracking_branch:
-            print(
-                "No remote URL found for current branch, please specify --repo "
-                "manually."
-            )
-            return
-        uri = list(git.remote(tracking_branch.remote_name).urls)
-        if len(uri) == 1:
-            uri = uri[0]
-        else:
-            print("Multiple URL found, please manually specify.")
-            return
+    # TODO: Revisit this whole logic to adopt proper githubapi requests
+    # instead of this `branch_commits` approach that is not compatible with private repos. See ticket PXP-7714
+    # Skipping private repos for now
+    with session.profiler.span("private_check"):
+        private_check = session.get(
+            "%s/repos/%s" % (args.github_api_url, uri),
+            headers=headers,
+        )
+    private_check.raise_for_status()
+    private_check_json = private_check.json()
+    if private_check_json["private"] == True:
+        raise ReleaseNotesError("Cannot access private repos at the moment")
 
-        matches = _GITHUB_REMOTE.findall(uri)
-        if not matches:
-            print(f"Unable to match remote uri {uri} to regex `{_GITHUB_REMOTE}`")
-            return
-        uri = "".join(matches[0])
 
+def generate_release_notes(
+    args, g, session, cache=None, repo=None, tags=None, output=None
+):
+    """
+    Generate the release notes as specified by the `gen`, `tag` or `release`
+    command line arguments, with the given GitHub client, `GitHubSession` and
+    optional `ResolverCache`.
+
+    The GitHub repository and its `TagIndex` are fetched unless given in `repo`
+    and `tags`. The release notes are written to the `output` file-like object
+    if any, instead of the output file. Raise a `ReleaseNotesError` if they
+    cannot be generated as specified.
+    """
+    profiler = session.profiler
+    deadline_at = None
+    if getattr(args, "deadline", None):
+        if hasattr(args, "new_tag"):
+            raise ReleaseNotesError(
+                "--deadline cannot be used with tag: the annotation of the tag "
+                "cannot be completed later"
+            )
+        deadline_at = time.monotonic() + args.deadline
+    # the waits for the rate limit cannot cross the deadline either: the notes
+    # are written, but not published, if the rate limit is exhausted
+    session.deadline_at = deadline_at
+    rules = DEFAULT_PARSE_RULES
+    if args.parse_rules:
+        rules = ParseRules.load(args.parse_rules)
+
+    # Get GitHub Repository
+    uri = get_repo_uri(args)
     print("GitHub Repository URI: %s" % uri)
-    repo = g.get_repo(uri)
+    if repo is None:
+        with profiler.span("get_repo"):
+            repo = g.get_repo(uri)
     print("GitHub Repository: %s" % repo.full_name)
 
+    if tags is None:
+        with profiler.span("get_tags"):
+            tags = TagIndex(iter_pages(repo.get_tags(), args.jobs))
+
     # Get commit to stop collect changelogs to (inclusive)
     stop_tag = None
     release_tag = getattr(args, "release_tag", None)
     to_tag = getattr(args, "to_tag", None) or release_tag
     if to_tag:
-        for tag in repo.get_tags():
-            if to_tag == tag.name:
-                stop_tag = tag.name
-                stop_commit = tag.commit
-                break
-        else:
-            print("Cannot find tag: %s" % to_tag)
-            return
+        tag = tags.get(to_tag)
+        if not tag:
+            raise ReleaseNotesError("Cannot find tag: %s" % to_tag)
+        stop_tag = tag.name
+        stop_commit = tag.commit
     else:
-        stop_commit = repo.get_commits()[0]  # latest commit
+        with profiler.span("get_latest_commit"):
+            stop_commit = repo.get_commits()[0]  # latest commit
         if hasattr(args, "new_tag"):
             stop_tag = args.new_tag
-        else:
-            for tag in repo.get_tags():
-                if tag.commit.sha == stop_commit.sha:
-                    stop_tag = tag.name
-    repo.get_commit(stop_commit.sha)
+        elif tags.get_names(stop_commit.sha):
+            stop_tag = tags.get_names(stop_commit.sha)[-1]
+    with profiler.span("get_commit"):
+        repo.get_commit(stop_commit.sha)
     print("Generate changelog up to commit: %s" % stop_commit.sha)
 
     # Get commit to start collect changelogs from (exclusive)
     if args.from_tag:
-        for tag in repo.get_tags():
-            if args.from_tag == tag.name:
-                start_tag = tag
-                break
-        else:
-            print("Cannot find tag %s" % args.from_tag)
-            return
+        start_tag = tags.get(args.from_tag)
+        if not start_tag:
+            raise ReleaseNotesError("Cannot find tag %s" % args.from_tag)
     else:
-        upper_bound = parse_version(stop_tag) if stop_tag else None
-        start_tag = None
-        for tag in repo.get_tags():
-            ver = parse_version(tag.name)
-            # account for case where no start tag and ver is same as upper_bound
-            if upper_bound and ver == upper_bound:
-                continue
-            # find the most recent tag that's lower than `stop_tag`
-            start_ver = parse_version(start_tag.name) if start_tag else None
-            if (
-                not start_tag
-                or (
-                    # ignore non-semantic tags
-                    isinstance(ver, Version)
-                    and isinstance(start_ver, Version)
-                    # check if this tag is more recent than the current `start_tag`
-                    and ver > start_ver
-                )
-                and (not upper_bound or ver < upper_bound)
-            ):
-                start_tag = tag
+        start_tag = tags.get_previous(stop_tag)
         if not start_tag:
-            print("There is no tag found in this repository, please manually specify.")
-            return
-    repo.get_commit(start_tag.commit.sha)
+            raise ReleaseNotesError(
+                "There is no tag found in this repository, please manually specify."
+            )
+    with profiler.span("get_commit"):
+        repo.get_commit(start_tag.commit.sha)
     print(
         "Generate changelog starting from: %s (%s)"
         % (start_tag.name, start_tag.commit.sha)
     )
 
-    # Get all PR descriptions (and commit message if no PR related)
-    all_prs = set()
-    desc_bodies = []
     # add 1 second to the start date because the start commit should
     # be excluded from the result:
     start_date = start_tag.commit.commit.author.date + timedelta(0, 1)
-    stop_date = datetime.utcnow()
+    stop_date = session.utcnow()
 
     # If dates are specified by the user, they override dates from tags/commits
     from_date = getattr(args, "from_date", None)
@@ -378,21 +1180,11 @@ def main(args=None):
 
     # stop_date is timezone-naive, make it timezone-aware to avoid this error when comparing it to
     # other datetimes: `TypeError: can't compare offset-naive and offset-aware datetimes`
-    stop_date = stop_date.replace(tzinfo=pytz.UTC)
+    stop_date = stop_date.replace(tzinfo=timezone.utc)
 
     print("Start date: %s; Stop date: %s" % (start_date, stop_date))
 
-    # TODO: Revisit this whole logic to adopt proper githubapi requests
-    # instead of this `branch_commits` approach that is not compatible with private repos. See ticket PXP-7714
-    # Skipping private repos for now
-    private_check = requests.get(
-        "https://api.github.com/repos/%s" % (uri),
-        headers=headers,
-    )
-    private_check.raise_for_status()
-    private_check_json = private_check.json()
-    if private_check_json["private"] == True:
-        raise Exception("Cannot access private repos at the moment")
+    check_public_repo(args, uri, session)
 
     output_type = None
     if getattr(args, "markdown", release_tag):
@@ -409,9 +1201,38 @@ def main(args=None):
     ):
         output_type = "text"
 
-    if not to_tag:
+    known_prs = {}
+    if args.local:
+        from git import GitCommandError, Repo
+
+        # compute the exact range from the local clone instead
+        try:
+            commits, known_prs = get_local_commits(
+                Repo(search_parent_directories=True),
+                "%s..%s" % (start_tag.name, to_tag or stop_commit.sha),
+                since=from_date,
+                until=to_date,
+            )
+            listing = commits
+        except GitCommandError as e:
+            raise ReleaseNotesError(
+                "Unable to list the commits locally, make sure the tags are "
+                "fetched (`git fetch --tags`): %s" % e
+            )
+        print(
+            "Found %s commits locally, %s attributed to a PR from their subject"
+            % (len(commits), len(known_prs))
+        )
+    elif not from_date and not to_date:
+        # the exact range: the commits of the stop commit that are not in the
+        # start tag, so that no commit outside of the range is resolved
+        total_commits, commits = iter_range_commits(
+            repo, start_tag.commit.sha, stop_commit.sha, start_date, args.jobs
+        )
+    elif not to_tag:
         # get the commits on master branch
-        commits = repo.get_commits(since=start_date, until=stop_date)
+        listing = repo.get_commits(since=start_date, until=stop_date)
+        commits = iter_pages(listing, args.jobs)
     else:
         # only get the commits that are included in the specified tag.
         # handles edge case when the tag includes a recent commit and `stop_date` is more recent
@@ -422,102 +1243,2376 @@ def main(args=None):
         # - tag commits:
         #     01/25: merge commit or cherry-pick commit <------ `stop_date` = 01/25
         #     01/01: commit1
-        commits = repo.get_commits(since=start_date, until=stop_date, sha=to_tag)
+        listing = repo.get_commits(since=start_date, until=stop_date, sha=to_tag)
+        commits = iter_pages(listing, args.jobs)
+    if not args.local:
+        commits = ((commit.sha, commit.commit.message) for commit in commits)
 
-    for commit in commits:
-        # https://platform.github.community/t/get-pull-request-associated-with-merge-commit/6936
-        # https://github.blog/2014-10-13-linking-merged-pull-requests-from-commits/
-        # We are not using the search API because its rate limit is too low.
-        # This doesn't work for private repos, and we can't attach headers
-        # because it's not a GitHub API endpoint. See ticket PXP-7714
-        resp = requests.get(
-            "https://github.com/%s/branch_commits/%s" % (uri, commit.sha)
-        )
-        resp.raise_for_status()
-        prs = _GITHUB_PR.findall(resp.text)
-        if prs:
-            print("Commit %s: #%s" % (commit.sha, ", #".join(prs)))
-            for pr in prs:
-                pr = int(pr)
-                if pr not in all_prs:
-                    all_prs.add(pr)
-                    repo_pr = repo.get_pull(pr)
-                    # only parse the PR description if it was merged after the
-                    # stop date. (ignore commits that were pushed before the
-                    # stop date if their PR was merged after)
-                    if repo_pr.merged_at.replace(tzinfo=pytz.UTC) <= stop_date:
-                        desc_bodies.append((pr, "pr", repo_pr.body))
-        else:
-            print("Commit %s: no PR" % commit.sha)
-            desc_bodies.append((commit.sha[:6], "commit", commit.commit.message))
-
-    release_notes_raw = {"general updates": []}
-    for ref, ref_type, pr in desc_bodies:
-        release_notes_raw = parse_pr_body(
-            body=pr,
-            release_notes=release_notes_raw,
-            ref=ref,
-            ref_type=ref_type,
-            repo_uri=uri,
-            link_type=output_type,
-        )
-
-    release_notes = ReleaseNotes(release_notes_raw)
-    additional_text = """\
-For: {}
-Notes since tag: {}
-Notes to tag/commit: {}
-Generated: {}
-""".format(
-        repo.full_name,
-        start_tag.name,
-        stop_tag or stop_commit.sha,
-        datetime.now().date(),
+    resolver = get_resolver(
+        args, repo, uri, session, cache, since=start_date, tagged=bool(to_tag)
     )
 
-    if output_type == "markdown":
-        markdown = release_notes.export(
-            type_=ReleaseNotes.ExportType.MARKDOWN,
-            file=(args.file_name + ".md") if hasattr(args, "file_name") else None,
-            additional_text=additional_text,
+    # only resolve the commits after the checkpoint of the previous run, if any,
+    # and the ones it did not have the time to resolve
+    checkpoint = None
+    checkpoint_key = {
+        "repo": uri,
+        "from_tag": start_tag.name,
+        "to_tag": to_tag,
+        "from_date": from_date,
+        "to_date": to_date,
+    }
+    checkpoint_path = None
+    if getattr(args, "incremental", False):
+        checkpoint_path = args.file_name + ".checkpoint.json"
+    elif release_tag and deadline_at:
+        # the commits left after the deadline are resolved by the next run,
+        # which updates the release again
+        checkpoint_path = os.path.join(
+            get_cache_dir(),
+            "checkpoints",
+            "%s_%s.json" % (uri.replace("/", "_"), release_tag.replace("/", "_")),
         )
-        if release_tag:
-            print("Release tag: %s" % release_tag)
-            try:
-                release = repo.get_release(release_tag)
-            except Exception:
-                pass
-            else:
-                print(
-                    "Updating release (if this fails, make sure you have write access to the repo)"
-                )
-                release.update_release(
-                    release.title, markdown, release.draft, release.prerelease
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    if checkpoint_path:
+        checkpoint = load_checkpoint(checkpoint_path, checkpoint_key)
+    # with a deadline, the chunks are smaller so that the run stops closer to it
+    chunk_size = _CHUNK_SIZE
+    if deadline_at:
+        chunk_size = max(1, args.jobs) * 10
+    commits = ResumableCommits(
+        commits,
+        checkpoint,
+        deadline_at=deadline_at,
+        chunk_size=chunk_size,
+        profiler=profiler,
+    )
+    all_prs = commits.prs
+
+    # resolve and parse the commits a chunk at a time, and spill the parsed
+    # release notes to disk, so that the memory used does not depend on the
+    # number of commits
+    release_notes_raw = SpilledCategories({"general updates": []}, load=Entry._make)
+    merged_at = {}
+    commit_count = 0
+
+    def resolve(chunk):
+        nonlocal commit_count
+        desc_bodies = resolve_desc_bodies(
+            resolver,
+            chunk,
+            stop_date,
+            known_prs,
+            all_prs,
+            profiler=profiler,
+            merged_at=merged_at,
+        )
+        commit_count += len(chunk)
+        profiler.count("commits", len(chunk))
+        with profiler.span("parse"):
+            for ref, ref_type, body in desc_bodies:
+                date = merged_at.pop(ref, None) if ref_type == "pr" else None
+                parse_pr_entries(
+                    body,
+                    release_notes_raw,
+                    ref,
+                    ref_type,
+                    rules,
+                    merged_at=date and date.isoformat(),
                 )
-
-    if output_type == "html":
-        release_notes.export(
-            type_=ReleaseNotes.ExportType.HTML,
-            file=(args.file_name + ".html") if hasattr(args, "file_name") else None,
-            additional_text=additional_text,
+        print(
+            "Processed %s commits, %s pull requests so far"
+            % (commit_count, len(all_prs))
         )
 
-    if output_type == "text":
-        release_notes.export(
-            type_=ReleaseNotes.ExportType.TEXT,
-            file=(args.file_name + ".txt") if hasattr(args, "file_name") else None,
-            additional_text=additional_text,
-        )
+    commits.run(resolve, release_notes_raw)
 
-    if hasattr(args, "new_tag"):
-        annotation = release_notes.export(
-            type_=ReleaseNotes.ExportType.TEXT, additional_text=additional_text
+    footer_text = ""
+    unresolved = 0
+    if commits.pending is not None:
+        if args.local:
+            total = len(listing)
+        elif from_date or to_date:
+            total = listing.totalCount
+        else:
+            total = total_commits
+        unresolved = total - commits.resolved
+        footer_text = "%s commits unresolved" % unresolved
+        print("Deadline of %ss reached, %s" % (args.deadline, footer_text))
+    if checkpoint_path and (commits.first_sha or commits.checkpoint):
+        with profiler.span("save_checkpoint"):
+            commits.save(checkpoint_path, checkpoint_key, release_notes_raw)
+
+    if getattr(args, "artifact", None):
+        save_artifact(
+            args.artifact,
+            uri,
+            repo.full_name,
+            start_tag.name,
+            stop_tag or stop_commit.sha,
+            release_notes_raw,
+            unresolved,
+            github_url=args.github_url,
         )
-        repo.create_git_ref("refs/tags/" + args.new_tag, stop_commit.sha)
-        print("Created tag %s at %s" % (args.new_tag, stop_commit.sha))
 
+    release_notes = ReleaseNotes(
+        release_notes_raw,
+        repo_uri=uri,
+        link_type=output_type,
+        github_url=args.github_url,
+    )
+    additional_text = _ADDITIONAL_TEXT.format(
+        repo.full_name,
+        start_tag.name,
+        stop_tag or stop_commit.sha,
+        datetime.now().date(),
+    )
+
+    # render all the outputs in a single pass over the release notes
+    with profiler.span("export"), contextlib.ExitStack() as stack:
+        sinks = {}
+        if output_type:
+            type_, extension = _EXPORT_TYPES[output_type]
+            if output is not None:
+                sinks[type_] = output
+            elif hasattr(args, "file_name"):
+                full_path = os.path.abspath(args.file_name + extension)
+                print("Exporting release notes into file:\n{}\n".format(full_path))
+                sinks[type_] = stack.enter_context(open(full_path, "w+"))
+            else:
+                sinks[type_] = io.StringIO()
+        if hasattr(args, "new_tag"):
+            sinks.setdefault(ReleaseNotes.ExportType.TEXT, io.StringIO())
+        release_notes.write(
+            sinks, additional_text=additional_text, footer_text=footer_text
+        )
+
+    if output_type == "markdown" and release_tag:
+        markdown = sinks[ReleaseNotes.ExportType.MARKDOWN].getvalue()
+        print("Release tag: %s" % release_tag)
+        try:
+            release = repo.get_release(release_tag)
+        except DeadlineReached:
+            raise
+        except Exception:
+            pass
+        else:
+            print(
+                "Updating release (if this fails, make sure you have write access to the repo)"
+            )
+            with profiler.span("update_release"):
+                release.update_release(
+                    release.title, markdown, release.draft, release.prerelease
+                )
+
+    if hasattr(args, "new_tag"):
+        annotation = sinks[ReleaseNotes.ExportType.TEXT].getvalue()
+        with profiler.span("create_tag"):
+            repo.create_git_ref("refs/tags/" + args.new_tag, stop_commit.sha)
+        print("Created tag %s at %s" % (args.new_tag, stop_commit.sha))
+
+    result = None
     if not hasattr(args, "file_name"):
-        return release_notes.release_notes
+        result = {
+            category: list(release_notes.get_lines(values))
+            for category, values in release_notes_raw.items()
+        }
+    release_notes_raw.close()
+    return result
+
+
+def iter_releases(commits, tags, names):
+    """
+    Yield `(release, sha, message)` for the `(sha, message)` commits, listed from
+    the most recent one, where the release of a commit is the lowest version of
+    the `names` tags at this commit or, if none, the release of the previous
+    (more recent) commit.
+    """
+    names = set(names)
+    release = None
+    for sha, message in commits:
+        tagged = [name for name in tags.get_names(sha) if name in names]
+        if tagged:
+            release = min(tagged, key=parse_version)
+        yield release, sha, message
+
+
+def backfill_release_notes(args, g, session, cache=None):
+    """
+    Generate the release notes of every version tag between `--from-tag` and
+    `--to-tag`, as specified by the `backfill` command line arguments.
+
+    The history of the last tag is listed once, and each commit goes to the
+    release it first appeared in, found from the SHAs of the tags on the way.
+    Every commit and pull request is resolved only once, and the notes of a
+    release are written as soon as all its commits are parsed. Raise a
+    `ReleaseNotesError` if they cannot be generated as specified.
+    """
+    from packaging.version import Version
+
+    profiler = session.profiler
+    rules = DEFAULT_PARSE_RULES
+    if args.parse_rules:
+        rules = ParseRules.load(args.parse_rules)
+
+    uri = get_repo_uri(args)
+    print("GitHub Repository URI: %s" % uri)
+    with profiler.span("get_repo"):
+        repo = g.get_repo(uri)
+    print("GitHub Repository: %s" % repo.full_name)
+    with profiler.span("get_tags"):
+        tags = TagIndex(iter_pages(repo.get_tags(), args.jobs))
+    if len(tags.version_names) < 2:
+        raise ReleaseNotesError(
+            "At least 2 version tags are needed, found: %s" % tags.version_names
+        )
+
+    # the releases to generate the notes of, sorted by version
+    start_tag = tags.get(args.from_tag or tags.version_names[0])
+    stop_tag = tags.get(args.to_tag or tags.version_names[-1])
+    for name, tag in ((args.from_tag, start_tag), (args.to_tag, stop_tag)):
+        if not tag:
+            raise ReleaseNotesError("Cannot find tag %s" % name)
+        if not isinstance(parse_version(tag.name), Version):
+            raise ReleaseNotesError("Tag %s is not a version" % tag.name)
+    first = bisect.bisect_right(tags.versions, parse_version(start_tag.name))
+    last = bisect.bisect_right(tags.versions, parse_version(stop_tag.name))
+    names = tags.version_names[first:last]
+    if not names:
+        raise ReleaseNotesError(
+            "There is no version between %s and %s" % (start_tag.name, stop_tag.name)
+        )
+    previous = dict(zip(names, [start_tag.name] + names[:-1]))
+    print(
+        "Generate the release notes of %s releases, from %s to %s"
+        % (len(names), names[0], names[-1])
+    )
+
+    # add 1 second to the start date because the start commit should
+    # be excluded from the result
+    start_date = start_tag.commit.commit.author.date + timedelta(0, 1)
+    if args.from_date:
+        start_date = datetime.strptime(args.from_date, "%Y-%m-%d")
+    stop_date = session.utcnow().replace(tzinfo=timezone.utc)
+    print("Start date: %s" % start_date)
+
+    check_public_repo(args, uri, session)
+
+    output_type = "text"
+    if args.markdown:
+        output_type = "markdown"
+    elif args.html:
+        output_type = "html"
+    type_, extension = _EXPORT_TYPES[output_type]
+
+    resolver = get_resolver(
+        args, repo, uri, session, cache, since=start_date, tagged=True
+    )
+
+    def export(name, release_notes_raw):
+        full_path = os.path.abspath(
+            os.path.join(args.output_dir, name.replace("/", "_") + extension)
+        )
+        print("Exporting release notes of %s into file:\n%s\n" % (name, full_path))
+        additional_text = _ADDITIONAL_TEXT.format(
+            repo.full_name, previous[name], name, datetime.now().date()
+        )
+        with profiler.span("export"), open(full_path, "w+") as f:
+            ReleaseNotes(
+                release_notes_raw,
+                repo_uri=uri,
+                link_type=output_type,
+                github_url=args.github_url,
+            ).write({type_: f}, additional_text=additional_text)
+        release_notes_raw.close()
+        written.add(name)
+
+    written = set()
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.from_date:
+        commits = iter_pages(
+            repo.get_commits(since=start_date, sha=stop_tag.name), args.jobs
+        )
+    else:
+        _, commits = iter_range_commits(
+            repo, start_tag.commit.sha, stop_tag.commit.sha, start_date, args.jobs
+        )
+    commits = ((commit.sha, commit.commit.message) for commit in commits)
+
+    # a release's commits are consecutive in the listing: resolve and parse
+    # them a chunk at a time, and write the release's notes at its last commit
+    all_prs = set()
+    found = set()
+    commit_count = 0
+    for release, rows in itertools.groupby(
+        iter_releases(commits, tags, names), key=lambda row: row[0]
+    ):
+        release_notes_raw = SpilledCategories({"general updates": []}, load=Entry._make)
+        chunks = iter_chunks(((sha, message) for _, sha, message in rows), _CHUNK_SIZE)
+        while True:
+            with profiler.span("list_commits"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            for sha, _ in chunk:
+                found.update(tags.get_names(sha))
+            commit_count += len(chunk)
+            profiler.count("commits", len(chunk))
+            desc_bodies = resolve_desc_bodies(
+                resolver, chunk, stop_date, all_prs=all_prs, profiler=profiler
+            )
+            with profiler.span("parse"):
+                for ref, ref_type, body in desc_bodies:
+                    parse_pr_entries(body, release_notes_raw, ref, ref_type, rules)
+            print(
+                "Processed %s commits, %s pull requests so far"
+                % (commit_count, len(all_prs))
+            )
+        export(release, release_notes_raw)
+
+    # the other releases at the same commit as a release have no changes
+    missing = []
+    for name in names:
+        if name in found and name not in written:
+            export(name, SpilledCategories({"general updates": []}))
+        elif name not in found:
+            missing.append(name)
+    if missing:
+        print(
+            "Not in the history of %s, use `gen --to-tag` instead: %s"
+            % (stop_tag.name, ", ".join(missing))
+        )
+
+
+class BranchCommitsResolver(object):
+    """
+    Find the pull requests associated with commits by scraping GitHub's
+    `branch_commits` page, and get the pull requests from the REST API.
+    """
+
+    def __init__(self, repo, uri, jobs=1, session=None, github_url=_GITHUB_URL):
+        self.repo = repo
+        self.uri = uri
+        self.jobs = max(1, jobs)
+        self.session = session or GitHubSession(jobs)
+        self.github_url = github_url
+
+    def get_commit_prs(self, shas):
+        """
+        Return, for each commit SHA, the list of associated pull request numbers.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return list(executor.map(self._get_commit_prs, shas))
+
+    def get_pulls(self, numbers):
+        """
+        Return a `{number: PullRequest}` dict for the given pull requests.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            return dict(zip(numbers, executor.map(self._get_pull, numbers)))
+
+    def _get_commit_prs(self, sha):
+        # https://platform.github.community/t/get-pull-request-associated-with-merge-commit/6936
+        # https://github.blog/2014-10-13-linking-merged-pull-requests-from-commits/
+        # We are not using the search API because its rate limit is too low.
+        # This doesn't work for private repos, and we can't attach headers
+        # because it's not a GitHub API endpoint. See ticket PXP-7714
+        resp = self.session.get(
+            "%s/%s/branch_commits/%s" % (self.github_url, self.uri, sha)
+        )
+        resp.raise_for_status()
+        return [int(pr) for pr in _GITHUB_PR.findall(resp.text)]
+
+    def _get_pull(self, number):
+        repo_pr = self.repo.get_pull(number)
+        return PullRequest(repo_pr.body, repo_pr.merged_at, repo_pr.updated_at)
+
+
+class GraphQLResolver(BranchCommitsResolver):
+    """
+    Find the merged pull requests associated with commits, along with their body
+    and merge date, with batched GitHub GraphQL API queries of up to `batch_size`
+    commits each. Requires an access token.
+    """
+
+    def __init__(
+        self,
+        repo,
+        uri,
+        token,
+        jobs=1,
+        session=None,
+        batch_size=100,
+        graphql_url=None,
+    ):
+        super(GraphQLResolver, self).__init__(repo, uri, jobs, session)
+        self.token = token
+        self.batch_size = batch_size
+        self.graphql_url = graphql_url or get_graphql_url(_GITHUB_API_URL)
+        self._pulls = {}
+
+    def get_commit_prs(self, shas):
+        from concurrent.futures import ThreadPoolExecutor
+
+        shas = list(shas)
+        batches = [
+            shas[i : i + self.batch_size] for i in range(0, len(shas), self.batch_size)
+        ]
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            results = list(executor.map(self._query_batch, batches))
+        return [prs for batch in results for prs in batch]
+
+    def get_pulls(self, numbers):
+        # pull requests found by `get_commit_prs` are already known, only fall
+        # back to the REST API for the other ones
+        missing = [number for number in numbers if number not in self._pulls]
+        pulls = super(GraphQLResolver, self).get_pulls(missing)
+        pulls.update(
+            (number, self._pulls[number]) for number in numbers if number in self._pulls
+        )
+        return pulls
+
+    def _query_batch(self, shas):
+        owner, name = self.uri.split("/", 1)
+        query = "query($owner: String!, $name: String!) {\n"
+        query += "  repository(owner: $owner, name: $name) {\n"
+        for i, sha in enumerate(shas):
+            if not _COMMIT_SHA.match(sha):
+                raise ValueError("Invalid commit SHA: %s" % sha)
+            query += (
+                '    c%s: object(oid: "%s") { ... on Commit { '
+                "associatedPullRequests(first: 10) { "
+                "nodes { number body mergedAt updatedAt } } } }\n" % (i, sha)
+            )
+        query += "  }\n}\n"
+
+        resp = self.session.post(
+            self.graphql_url,
+            json={"query": query, "variables": {"owner": owner, "name": name}},
+            headers={"Authorization": "bearer %s" % self.token},
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get("errors"):
+            raise Exception("GitHub GraphQL query failed: %s" % data["errors"])
+
+        repository = data["data"]["repository"]
+        result = []
+        for i in range(len(shas)):
+            prs = []
+            commit = repository.get("c%s" % i) or {}
+            for node in commit.get("associatedPullRequests", {}).get("nodes", []):
+                # unmerged pull requests containing the commit are not relevant
+                if not node["mergedAt"]:
+                    continue
+                self._pulls[node["number"]] = PullRequest(
+                    node["body"],
+                    parse_github_date(node["mergedAt"]),
+                    parse_github_date(node["updatedAt"]),
+                )
+                prs.append(node["number"])
+            result.append(prs)
+        return result
+
+
+class PrefetchedResolver(object):
+    """
+    Wrap a resolver so that pull requests are read from a `{number:
+    PullRequest}` dict of prefetched pull requests, see `prefetch_pulls`, and
+    only looked up for the other ones.
+    """
+
+    def __init__(self, resolver, pulls, profiler=None):
+        self.resolver = resolver
+        self.uri = resolver.uri
+        self.pulls = pulls
+        self.profiler = profiler or NullProfiler()
+
+    def get_commit_prs(self, shas):
+        return self.resolver.get_commit_prs(shas)
+
+    def get_pulls(self, numbers):
+        pulls = {
+            number: self.pulls[number] for number in numbers if number in self.pulls
+        }
+        missing = [number for number in numbers if number not in pulls]
+        self.profiler.count("prefetch.pulls.hits", len(pulls))
+        self.profiler.count("prefetch.pulls.misses", len(missing))
+        if missing:
+            pulls.update(self.resolver.get_pulls(missing))
+        return pulls
+
+
+def prefetch_pulls(repo, since, profiler=None):
+    """
+    Return a `{number: PullRequest}` dict of the pull requests merged into the
+    default branch of `repo` and updated since the `since` date.
+
+    The closed pull requests are listed from the most recently updated one, a
+    page of 100 at a time, until one was last updated before `since`: merging a
+    pull request updates it, so the following ones were all merged before.
+    """
+    profiler = profiler or NullProfiler()
+    with profiler.span("prefetch_pulls"):
+        pulls = list_updated_pulls(repo, since, base=repo.default_branch)
+    profiler.count("pulls.prefetched", len(pulls))
+    print("Prefetched %s merged pull requests" % len(pulls))
+    return pulls
+
+
+def list_updated_pulls(repo, since, base=None):
+    """
+    Return a `{number: PullRequest}` dict of the pull requests of `repo` merged
+    (into the `base` branch, if given) and updated since the `since` date, from
+    the listing of the closed pull requests by last update, see `prefetch_pulls`.
+    """
+    # older PyGithub versions return naive UTC datetimes
+    since = as_utc(since)
+    kwargs = {"base": base} if base else {}
+    pulls = {}
+    for pull in repo.get_pulls(
+        state="closed", sort="updated", direction="desc", **kwargs
+    ):
+        updated_at = as_utc(pull.updated_at)
+        if updated_at < since:
+            break
+        if pull.merged_at:
+            pulls[pull.number] = PullRequest(
+                pull.body, as_utc(pull.merged_at), updated_at
+            )
+    return pulls
+
+
+class CachedResolver(object):
+    """
+    Wrap a resolver so that commit to pull request mappings and merged pull
+    requests are read from, and saved to, a `ResolverCache` or
+    `MemoryResolverCache`.
+
+    A pull request body can be edited after the merge: if `repo` is given, the
+    cached pull requests are validated once, with a listing of the pull requests
+    of `repo` updated since the last validation (a single request, usually).
+    Without `repo`, the cache is expected to be kept up to date otherwise.
+
+    A commit without pull request may be associated with one later, unless it
+    is already in a tag: the empty results are only cached with `cache_empty`,
+    for the commits in a tag.
+    """
+
+    def __init__(
+        self,
+        resolver,
+        cache,
+        refresh=False,
+        profiler=None,
+        repo=None,
+        cache_empty=False,
+    ):
+        self.resolver = resolver
+        self.uri = resolver.uri
+        self.cache = cache
+        self.refresh = refresh
+        self.profiler = profiler or NullProfiler()
+        self.repo = repo
+        self.cache_empty = cache_empty
+        self._validated = refresh or repo is None
+
+    def get_commit_prs(self, shas):
+        shas = list(shas)
+        cached = {} if self.refresh else self.cache.get_commit_prs(self.uri, shas)
+        missing = [sha for sha in shas if sha not in cached]
+        self.profiler.count("cache.commit_prs.hits", len(shas) - len(missing))
+        self.profiler.count("cache.commit_prs.misses", len(missing))
+        if missing:
+            found = dict(zip(missing, self.resolver.get_commit_prs(missing)))
+            self.cache.set_commit_prs(
+                self.uri,
+                {sha: prs for sha, prs in found.items() if prs or self.cache_empty},
+            )
+            cached.update(found)
+        return [cached[sha] for sha in shas]
+
+    def get_pulls(self, numbers):
+        if not self._validated:
+            self.validate_pulls()
+        cached = {} if self.refresh else self.cache.get_pulls(self.uri, numbers)
+        missing = [number for number in numbers if number not in cached]
+        self.profiler.count("cache.pulls.hits", len(numbers) - len(missing))
+        self.profiler.count("cache.pulls.misses", len(missing))
+        if missing:
+            found = self.resolver.get_pulls(missing)
+            self.cache.set_pulls(self.uri, found)
+            cached.update(found)
+        return cached
+
+    def validate_pulls(self):
+        """
+        Update the cached pull requests that were updated since the last
+        validation. The first time, the pull requests cached without
+        validation, if any, are dropped instead.
+        """
+        # with a margin for the clock difference with GitHub
+        now = datetime.now(timezone.utc) - timedelta(minutes=5)
+        since = self.cache.get_pulls_validated(self.uri)
+        if since is None:
+            self.cache.delete_pulls(self.uri)
+        else:
+            with self.profiler.span("validate_pulls"):
+                pulls = list_updated_pulls(self.repo, since)
+            self.cache.set_pulls(self.uri, pulls)
+            self.profiler.count("cache.pulls.updated", len(pulls))
+            print("%s cached pull requests updated since %s" % (len(pulls), since))
+        self.cache.set_pulls_validated(self.uri, now)
+        self._validated = True
+
+
+def get_cache_dir():
+    """
+    Return the directory of the cache and of the `release` checkpoints.
+    """
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "gen3git"
+    )
+
+
+class ResolverCache(object):
+    """
+    SQLite cache of the commit to pull request mappings and of the merged pull
+    requests, and ETag store of the API responses (see `GitHubSession`), so
+    that notes for an already seen range can be generated again without
+    fetching everything.
+
+    Pull requests are keyed by `(repo, number, updated_at)`, and the most
+    recently updated version is returned. The time they were last validated
+    (see `CachedResolver`) is kept per repository. Entries older than `max_age` seconds are evicted when the cache is opened, as
+    well as the oldest entries beyond `max_entries` per table.
+    """
+
+    def __init__(self, path=None, max_age=30 * 24 * 3600, max_entries=100000):
+        import sqlite3
+
+        if not path:
+            path = os.path.join(get_cache_dir(), "cache.sqlite")
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.path = path
+        # the ETags are read and written from the request worker threads
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.RLock()
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS commit_prs (
+                repo TEXT, sha TEXT, prs TEXT, created REAL,
+                PRIMARY KEY (repo, sha)
+            );
+            CREATE TABLE IF NOT EXISTS pulls (
+                repo TEXT, number INTEGER, updated_at TEXT, body TEXT,
+                merged_at TEXT, created REAL,
+                PRIMARY KEY (repo, number, updated_at)
+            );
+            CREATE TABLE IF NOT EXISTS pulls_validated (
+                repo TEXT PRIMARY KEY, validated TEXT
+            );
+            CREATE TABLE IF NOT EXISTS etags (
+                key TEXT PRIMARY KEY, etag TEXT, headers TEXT, content BLOB,
+                created REAL
+            );
+            """
+        )
+        self.evict(max_age, max_entries)
+
+    def evict(self, max_age, max_entries):
+        with self._lock, self.connection:
+            for table in ("commit_prs", "pulls", "etags"):
+                self.connection.execute(
+                    "DELETE FROM %s WHERE created < ?" % table,
+                    (time.time() - max_age,),
+                )
+                self.connection.execute(
+                    "DELETE FROM %s WHERE rowid NOT IN "
+                    "(SELECT rowid FROM %s ORDER BY created DESC LIMIT ?)"
+                    % (table, table),
+                    (max_entries,),
+                )
+
+    def get_commit_prs(self, repo, shas):
+        result = {}
+        with self._lock:
+            for sha in shas:
+                row = self.connection.execute(
+                    "SELECT prs FROM commit_prs WHERE repo = ? AND sha = ?",
+                    (repo, sha),
+                ).fetchone()
+                if row:
+                    result[sha] = json.loads(row[0])
+        return result
+
+    def set_commit_prs(self, repo, commit_prs):
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO commit_prs VALUES (?, ?, ?, ?)",
+                [(repo, sha, json.dumps(prs), now) for sha, prs in commit_prs.items()],
+            )
+
+    def get_pulls(self, repo, numbers):
+        result = {}
+        with self._lock:
+            for number in numbers:
+                row = self.connection.execute(
+                    "SELECT body, merged_at, updated_at FROM pulls "
+                    "WHERE repo = ? AND number = ? ORDER BY updated_at DESC LIMIT 1",
+                    (repo, number),
+                ).fetchone()
+                if row:
+                    result[number] = PullRequest(
+                        row[0],
+                        as_utc(datetime.fromisoformat(row[1])),
+                        as_utc(datetime.fromisoformat(row[2])),
+                    )
+        return result
+
+    def set_pulls(self, repo, pulls):
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO pulls VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        repo,
+                        number,
+                        as_utc(pull.updated_at).isoformat(),
+                        pull.body,
+                        as_utc(pull.merged_at).isoformat(),
+                        now,
+                    )
+                    for number, pull in pulls.items()
+                    # pull requests that are not merged yet can still change
+                    if pull.merged_at and pull.updated_at
+                ],
+            )
+
+    def delete_pulls(self, repo):
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM pulls WHERE repo = ?", (repo,))
+
+    def get_pulls_validated(self, repo):
+        """
+        Return the time the pull requests of `repo` were last validated, or None.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT validated FROM pulls_validated WHERE repo = ?", (repo,)
+            ).fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def set_pulls_validated(self, repo, validated):
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO pulls_validated VALUES (?, ?)",
+                (repo, validated.isoformat()),
+            )
+
+    def get_etag(self, key):
+        """
+        Return the `(etag, headers, content)` stored for a request, or None.
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT etag, headers, content FROM etags WHERE key = ?", (key,)
+            ).fetchone()
+        if row:
+            return row[0], json.loads(row[1]), row[2]
+        return None
+
+    def set_etag(self, key, etag, headers, content):
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO etags VALUES (?, ?, ?, ?, ?)",
+                (key, etag, json.dumps(dict(headers)), content, time.time()),
+            )
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+
+def get_local_commits(git, rev_range, since=None, until=None):
+    """
+    List the commits of `rev_range` (e.g. "1.0.0..1.1.0") in a local clone, as
+    `(sha, message)` tuples, newest first.
+
+    Also return a `{sha: [pr number]}` dict of the commits that can be attributed
+    to a pull request without any network call: merge and squash commits, from
+    their subject, and the commits of a merged pull request branch.
+    """
+    commits = []
+    known_prs = {}
+    kwargs = {}
+    if since:
+        kwargs["since"] = since
+    if until:
+        kwargs["until"] = until
+    for commit in git.iter_commits(rev_range, **kwargs):
+        commits.append((commit.hexsha, commit.message))
+        pr = get_subject_pr(commit.message)
+        if pr is None:
+            continue
+        known_prs[commit.hexsha] = [pr]
+        if len(commit.parents) == 2:
+            # the commits only reachable from the merged branch are part of the PR
+            branch_range = "%s..%s" % (
+                commit.parents[0].hexsha,
+                commit.parents[1].hexsha,
+            )
+            for branch_commit in git.iter_commits(branch_range):
+                known_prs.setdefault(branch_commit.hexsha, [pr])
+    return commits, known_prs
+
+
+def get_subject_pr(message):
+    """
+    Return the PR number from the subject of a merge commit ("Merge pull request
+    #N from ...") or of a squash commit ("Subject (#N)"), or None.
+    """
+    subject = message.strip().split("\n", 1)[0].strip()
+    match = _MERGE_SUBJECT.match(subject) or _SQUASH_SUBJECT.search(subject)
+    return int(match.group(1)) if match else None
+
+
+def resolve_desc_bodies(
+    resolver,
+    commits,
+    stop_date,
+    known_prs=None,
+    all_prs=None,
+    profiler=None,
+    merged_at=None,
+):
+    """
+    Get all PR descriptions (and commit message if no PR related) for the given
+    `(sha, message)` commits, as a list of `(ref, ref_type, body)` tuples.
+
+    The PRs of the commits in `known_prs` (`{sha: [pr number]}`) are not looked
+    up. The resolver may look up the other commits and pull requests concurrently
+    or in batches, but the result is in the same order as if the commits were
+    processed one by one.
+
+    The PRs in the `all_prs` set, if specified, are skipped, and the PRs found
+    are added to it. The merge date of the PRs returned is added to the
+    `merged_at` dict, if specified.
+    """
+    profiler = profiler or NullProfiler()
+    commits = list(commits)
+    known_prs = known_prs or {}
+    unknown_shas = [sha for sha, _ in commits if sha not in known_prs]
+    with profiler.span("get_commit_prs"):
+        found_prs = dict(zip(unknown_shas, resolver.get_commit_prs(unknown_shas)))
+    commit_prs = [known_prs.get(sha, found_prs.get(sha)) for sha, _ in commits]
+
+    if all_prs is None:
+        all_prs = set()
+
+    # fetch every PR only once, the first time it is seen
+    new_prs = []
+    seen_prs = set(all_prs)
+    for prs in commit_prs:
+        for pr in prs:
+            if pr not in seen_prs:
+                seen_prs.add(pr)
+                new_prs.append(pr)
+    with profiler.span("get_pulls"):
+        pulls = resolver.get_pulls(new_prs)
+    profiler.count("pulls", len(new_prs))
+
+    desc_bodies = []
+    for (sha, message), prs in zip(commits, commit_prs):
+        if prs:
+            print("Commit %s: #%s" % (sha, ", #".join(map(str, prs))))
+            for pr in prs:
+                if pr not in all_prs:
+                    all_prs.add(pr)
+                    repo_pr = pulls[pr]
+                    # only parse the PR description if it was merged after the
+                    # stop date. (ignore commits that were pushed before the
+                    # stop date if their PR was merged after)
+                    if as_utc(repo_pr.merged_at) <= stop_date:
+                        desc_bodies.append((pr, "pr", repo_pr.body))
+                        if merged_at is not None:
+                            merged_at[pr] = repo_pr.merged_at
+        else:
+            print("Commit %s: no PR" % sha)
+            desc_bodies.append((sha[:6], "commit", message))
+    return desc_bodies
+
+
+class ResumableCommits(object):
+    """
+    Resolve the `(sha, message)` commits of a range, listed newest first, a
+    chunk of `chunk_size` commits at a time, from where the `checkpoint` of a
+    previous run (see `load_checkpoint`) stopped, and until the `deadline_at`
+    time of `clock`, if any:
+    - after a checkpoint, the commits since its most recent commit are resolved
+      first, then its release notes are added, then the commits it did not have
+      the time to resolve
+    - a chunk is not started if it would end after the deadline, judging from
+      the duration of the previous one, and a chunk whose listing or resolving
+      raises `DeadlineReached` is left unresolved. The commits left are then
+      `pending`,
+      except the ones not listed yet, which the next run lists again after
+      `resume_sha`. The notes of the commits resolved by the next runs go
+      after the notes already saved
+
+    `prs` and `resolved` are the pull requests seen and the number of commits
+    resolved, by the previous runs too, and `first_sha` the most recent commit
+    of the range, resolved or not.
+    """
+
+    def __init__(
+        self,
+        commits,
+        checkpoint=None,
+        deadline_at=None,
+        chunk_size=_CHUNK_SIZE,
+        profiler=None,
+        clock=time.monotonic,
+    ):
+        self.deadline_at = deadline_at
+        self.chunk_size = chunk_size
+        self.profiler = profiler or NullProfiler()
+        self.clock = clock
+        self.checkpoint = None
+        self.prs = set()
+        self.resolved = 0
+        self.first_sha = None
+        self.pending = None
+        self.resume_sha = None
+        self._chunk_duration = 0
+
+        commits = iter(commits)
+        new_commits = None
+        if checkpoint:
+            # the commits since the checkpoint are listed first: if the checkpoint
+            # commit is not found, all the commits are processed again
+            with self.profiler.span("list_commits"):
+                new_commits = []
+                for sha, message in commits:
+                    if sha == checkpoint["stop_sha"]:
+                        break
+                    new_commits.append((sha, message))
+                else:
+                    print(
+                        "Checkpoint commit is not in the range anymore, starting over"
+                    )
+                    checkpoint = None
+                    commits = iter(new_commits)
+
+        # the commits to resolve in phases: `(commits, listed)` where `listed` is
+        # whether the commits are read from the listing of the range, and None
+        # where the notes of the checkpoint go
+        self._phases = [(commits, True)]
+        if checkpoint:
+            print(
+                "Resuming from checkpoint at commit %s: %s new commits, %s left to "
+                "resolve"
+                % (checkpoint["stop_sha"], len(new_commits), len(checkpoint["pending"]))
+            )
+            self.checkpoint = checkpoint
+            self.prs.update(checkpoint["prs"])
+            self.resolved = checkpoint["resolved"]
+            self.first_sha = (
+                new_commits[0][0] if new_commits else checkpoint["stop_sha"]
+            )
+            self.resume_sha = checkpoint["resume_sha"]
+            queued = [(sha, message) for sha, message in checkpoint["pending"]]
+            self._phases = [(iter(new_commits), False), None, (iter(queued), False)]
+            if self.resume_sha:
+                # the rest of the listing, after the last commit resolved
+                tail = itertools.dropwhile(
+                    lambda commit: commit[0] != self.resume_sha, commits
+                )
+                self._phases.append((itertools.islice(tail, 1, None), True))
+
+    def run(self, resolve, release_notes):
+        """
+        Call `resolve(chunk)` on each chunk of commits to resolve them and parse
+        their release notes into `release_notes`, until the deadline. The
+        release notes of the checkpoint are added to `release_notes` in order.
+        """
+        for phase in self._phases:
+            if phase is None:
+                # the new entries are the most recent ones
+                for category, values in self.checkpoint["release_notes"].items():
+                    release_notes.setdefault(category, []).extend(
+                        map(Entry._make, values)
+                    )
+                continue
+            commits, listed = phase
+            if self.pending is None:
+                chunk, last_sha = self._resolve(commits, resolve)
+                if chunk is not None and listed:
+                    # the chunk is listed again by the next run
+                    self.pending = []
+                    self.resume_sha = last_sha or self.resume_sha
+                elif chunk is not None:
+                    self.pending = chunk + list(commits)
+            elif not listed:
+                self.pending.extend(commits)
+
+    def save(self, path, key, release_notes):
+        """
+        Save the checkpoint of this run, see `save_checkpoint`.
+        """
+        save_checkpoint(
+            path,
+            key,
+            self.first_sha,
+            self.prs,
+            release_notes,
+            pending=self.pending or [],
+            resume_sha=self.resume_sha if self.pending is not None else None,
+            resolved=self.resolved,
+        )
+
+    def _resolve(self, commits, resolve):
+        """
+        Resolve the commits until the deadline. Return the first chunk of
+        commits not resolved (empty if it could not be listed), or None if all
+        are, and the last commit resolved.
+        """
+        last_sha = None
+        chunks = iter_chunks(commits, self.chunk_size)
+        while True:
+            try:
+                with self.profiler.span("list_commits"):
+                    chunk = next(chunks, None)
+            except DeadlineReached as e:
+                print(e)
+                return [], last_sha
+            if chunk is None:
+                return None, last_sha
+            # stop if the next chunk would take as long as the previous one
+            if (
+                self.deadline_at
+                and self.clock() + self._chunk_duration > self.deadline_at
+            ):
+                return chunk, last_sha
+            started = self.clock()
+            try:
+                resolve(chunk)
+            except DeadlineReached as e:
+                print(e)
+                return chunk, last_sha
+            self.first_sha = self.first_sha or chunk[0][0]
+            self.resolved += len(chunk)
+            self._chunk_duration = self.clock() - started
+            last_sha = chunk[-1][0]
+
+
+def load_checkpoint(path, key):
+    """
+    Return the checkpoint saved at `path` by `save_checkpoint`, or None if there
+    is none or it was saved for a different `key`.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("version") != _CHECKPOINT_VERSION or checkpoint["key"] != key:
+        print("Ignoring checkpoint %s saved for different options or version" % path)
+        return None
+    return checkpoint
+
+
+def save_checkpoint(
+    path, key, stop_sha, prs, release_notes, pending=(), resume_sha=None, resolved=0
+):
+    """
+    Save the most recent commit processed, the PRs seen and the parsed release
+    notes, so that the next incremental run only processes the newer commits.
+
+    The commits not resolved before the deadline, if any, are saved too: the
+    `(sha, message)` commits `pending`, and the commits after `resume_sha` in
+    the listing of the range. `resolved` is the number of commits resolved.
+    """
+    checkpoint = {
+        "version": _CHECKPOINT_VERSION,
+        "key": key,
+        "stop_sha": stop_sha,
+        "prs": sorted(prs),
+        "release_notes": release_notes,
+        "pending": list(pending),
+        "resume_sha": resume_sha,
+        "resolved": resolved,
+    }
+    with open(path + ".tmp", "w") as f:
+        dump_json(checkpoint, f)
+    os.replace(path + ".tmp", path)
+    print("Saved checkpoint at commit %s into %s" % (stop_sha, os.path.abspath(path)))
+
+
+def save_artifact(
+    path,
+    uri,
+    full_name,
+    from_ref,
+    to_ref,
+    entries,
+    unresolved=0,
+    github_url=_GITHUB_URL,
+):
+    """
+    Save the `parse_pr_entries` entries of the release notes of `full_name`
+    between `from_ref` and `to_ref` into a JSON file, to be rendered by
+    `render_artifact` with links to the `github_url` website.
+    """
+    artifact = {
+        "version": _ARTIFACT_VERSION,
+        "repo": uri,
+        "github_url": github_url,
+        "full_name": full_name,
+        "from": from_ref,
+        "to": to_ref,
+        "generated": str(datetime.now().date()),
+        "unresolved": unresolved,
+        "entries": entries,
+    }
+    with open(path + ".tmp", "w") as f:
+        dump_json(artifact, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+    print("Saved the release notes artifact into %s" % os.path.abspath(path))
+
+
+def render_artifact(args):
+    """
+    Render the release notes of an artifact saved by `save_artifact`, as
+    specified by the `render` command line arguments.
+    """
+    with open(args.artifact_file) as f:
+        artifact = json.load(f)
+    if artifact.get("version") != _ARTIFACT_VERSION:
+        print(
+            "Unsupported artifact version %s, generate it again with this version of "
+            "gen3git" % artifact.get("version")
+        )
+        sys.exit(1)
+
+    output_type = "text"
+    for type_ in ("slack", "markdown", "html"):
+        if getattr(args, type_):
+            output_type = type_
+            break
+    width = args.width
+    if width is None:
+        # Slack wraps the lines itself
+        width = 0 if output_type == "slack" else 76
+
+    release_notes = ReleaseNotes(
+        {
+            category: [Entry._make(entry) for entry in entries]
+            for category, entries in artifact["entries"].items()
+        },
+        width=width,
+        repo_uri=artifact["repo"],
+        link_type=output_type,
+        github_url=artifact.get("github_url", _GITHUB_URL),
+    )
+    additional_text = _ADDITIONAL_TEXT.format(
+        artifact["full_name"], artifact["from"], artifact["to"], artifact["generated"]
+    )
+    footer_text = ""
+    if artifact["unresolved"]:
+        footer_text = "%s commits unresolved" % artifact["unresolved"]
+
+    type_, extension = _EXPORT_TYPES[output_type]
+    with contextlib.ExitStack() as stack:
+        sink = sys.stdout
+        if args.file_name:
+            full_path = os.path.abspath(args.file_name + extension)
+            print("Exporting release notes into file:\n{}\n".format(full_path))
+            sink = stack.enter_context(open(full_path, "w+"))
+        release_notes.write(
+            {type_: sink}, additional_text=additional_text, footer_text=footer_text
+        )
+
+
+class Profiler(object):
+    """
+    Record the duration of the phases of a run (`span`) and counters (`count`),
+    such as the HTTP requests per endpoint, and report them as JSON. Can be
+    used from several threads.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans = []
+        self.counters = Counter()
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            with self._lock:
+                self.spans.append(
+                    {
+                        "name": name,
+                        "start": round(start - self.start, 6),
+                        "duration": round(end - start, 6),
+                    }
+                )
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def count_request(self, method, url, size=0):
+        """
+        Count an HTTP request (each attempt, for the retried ones) and the size
+        of its response body.
+        """
+        endpoint = get_endpoint(method, url)
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.counters["http.requests"] += 1
+            self.counters["http.bytes"] += size
+
+    def get_report(self):
+        with self._lock:
+            return {
+                "duration": round(time.perf_counter() - self.start, 6),
+                "spans": list(self.spans),
+                "counters": dict(sorted(self.counters.items())),
+                "requests": dict(sorted(self.requests.items())),
+            }
+
+    def save(self, path=None):
+        """
+        Write the JSON report to the file at `path`, or print it.
+        """
+        report = json.dumps(self.get_report(), indent=2)
+        if path:
+            full_path = os.path.abspath(path)
+            print("Exporting profile into file:\n{}\n".format(full_path))
+            with open(full_path, "w") as f:
+                f.write(report + "\n")
+        else:
+            print(report)
+
+
+class NullProfiler(object):
+    """
+    `Profiler` that records nothing, used when profiling is off.
+    """
+
+    _span = contextlib.nullcontext()
+
+    def span(self, name):
+        return self._span
+
+    def count(self, name, value=1):
+        pass
+
+    def count_request(self, method, url, size=0):
+        pass
+
+    def save(self, path=None):
+        pass
+
+
+def get_profiler(args):
+    if args.profile or args.trace_file:
+        return Profiler()
+    return NullProfiler()
+
+
+def get_endpoint(method, url):
+    """
+    Return the endpoint of a request to count it, e.g.
+    "GET /repos/:owner/:repo/pulls/:number": the owner and repository, numbers
+    and commit SHAs in the path are replaced by placeholders.
+    """
+    segments = urlparse(url).path.strip("/").split("/")
+    if segments[0] == "repos" and len(segments) >= 3:
+        segments[1:3] = [":owner", ":repo"]
+    elif len(segments) >= 3 and segments[2] == "branch_commits":
+        segments[0:2] = [":owner", ":repo"]
+    for i, segment in enumerate(segments):
+        if _COMMIT_SHA.match(segment):
+            segments[i] = ":sha"
+        elif "..." in segment:
+            segments[i] = ":base...:head"
+        elif segment.isdigit():
+            segments[i] = ":number"
+    return "%s /%s" % (method, "/".join(segments))
+
+
+class RateLimiter(object):
+    """
+    Track one GitHub rate limit from the `X-RateLimit-*` response headers, and
+    throttle the number of concurrent requests to match the remaining quota:
+    the concurrency goes down when few calls are left, and requests wait for
+    the reset once the quota is exhausted, unless the reset is after their
+    `deadline_at`. The last `reserve` calls are kept for later, e.g. for the
+    other repositories of a batch (see `RateLimitBudget`): requests wait for the
+    reset once they are reached.
+    """
+
+    def __init__(self, max_concurrency=1):
+        self.max_concurrency = max(1, max_concurrency)
+        self.remaining = None
+        self.reset = None
+        self.reserve = 0
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline_at=None):
+        with self._condition:
+            while True:
+                if (
+                    self.remaining is not None
+                    and self.remaining <= self.reserve
+                    and self.reset
+                ):
+                    wait = self.reset - time.time()
+                    if wait > 0:
+                        check_deadline(deadline_at, wait + 1)
+                        if self.remaining:
+                            print(
+                                "%s API calls left, kept for later, waiting %ss for "
+                                "reset" % (self.remaining, int(wait))
+                            )
+                        else:
+                            print(
+                                "Rate limit exhausted, waiting %ss for reset"
+                                % int(wait)
+                            )
+                        self._condition.wait(wait + 1)
+                        continue
+                    # unknown until the next response
+                    self.remaining = None
+                if self._in_flight < self._get_concurrency():
+                    break
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self, headers=None):
+        with self._condition:
+            self._in_flight -= 1
+            if headers:
+                self.update(headers)
+            self._condition.notify_all()
+
+    def update(self, headers):
+        remaining = headers.get("x-ratelimit-remaining")
+        reset = headers.get("x-ratelimit-reset")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset is not None:
+            self.reset = int(reset)
+
+    def set_reserve(self, reserve, remaining, reset):
+        """
+        Keep the last `reserve` calls for later, given the `remaining` calls
+        until the `reset` timestamp.
+        """
+        with self._condition:
+            self.reserve = reserve
+            self.remaining = remaining
+            self.reset = reset
+            self._condition.notify_all()
+
+    def _get_concurrency(self):
+        if self.remaining is None:
+            return self.max_concurrency
+        # keep a margin of ~10 calls per concurrent request
+        return max(1, min(self.max_concurrency, (self.remaining - self.reserve) // 10))
+
+
+def get_retry_wait(status, headers, attempt, message=""):
+    """
+    Return how many seconds to wait before retrying a rate limited request, or
+    None if the response is not a rate limit error. `message` is the body of
+    the error response, which tells the secondary rate limits apart. The waits
+    are jittered, so that the concurrent requests that were rate limited
+    together are not all retried at the same time.
+    """
+    import random
+
+    if status not in (403, 429):
+        return None
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        return int(retry_after) + random.random()
+    reset = headers.get("x-ratelimit-reset")
+    if headers.get("x-ratelimit-remaining") == "0" and reset:
+        return max(0, int(reset) - time.time()) + 1 + random.random()
+    message = message.lower()
+    if "secondary rate limit" in message or "abuse detection" in message:
+        # GitHub asks to wait at least a minute, like PyGithub's own retries
+        return _SECONDARY_RATE_LIMIT_WAIT + random.uniform(0, min(60, 2**attempt))
+    if status == 429:
+        return random.uniform(0, min(60, 2**attempt))
+    # any other 403 is an actual permission error
+    return None
+
+
+def get_http_session(jobs=1, max_retries=5):
+    """
+    Return the `requests.Session` that carries all the HTTP traffic of gen3git,
+    both the API requests of PyGithub and the website requests. Its connections
+    are kept alive, with at most `2 * jobs` (and at least 10) connections per
+    host, as the listing and the resolving each send up to `jobs` requests at
+    once. The responses are gzipped, and the requests that could not connect or
+    got a 5xx error are retried up to `max_retries` times, after a jittered
+    exponential backoff. The rate limited requests are retried by `GitHubSession`.
+    The proxy variables of the environment apply, but not `~/.netrc`.
+    """
+    import random
+    import requests
+    from urllib3.util.retry import Retry
+
+    class JitteredRetry(Retry):
+        def get_backoff_time(self):
+            return random.uniform(0, super(JitteredRetry, self).get_backoff_time())
+
+    retry = JitteredRetry(
+        total=max_retries,
+        status_forcelist=(500, 502, 503, 504),
+        # like PyGithub's own retries, which this replaces
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"GET", "POST"},
+        backoff_factor=0.5,
+        raise_on_status=False,
+    )
+    pool_size = max(10, 2 * jobs)
+    adapter = requests.adapters.HTTPAdapter(
+        pool_maxsize=pool_size, pool_block=True, max_retries=retry
+    )
+    session = requests.Session()
+    session.headers["Accept-Encoding"] = "gzip"
+    # like PyGithub's own session: the token is in the headers, and must not be
+    # replaced by the `~/.netrc` credentials of the host
+    session.auth = lambda request: request
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ResponseArchive(object):
+    """
+    Gzipped JSON archive of the GitHub responses of a run, keyed by request:
+    `--record` saves them, and `--replay` answers the same requests from the
+    archive without any network access. The time of the recording is kept as
+    `now`, so that the replayed run requests the same date range.
+    """
+
+    def __init__(self, path, replay=False):
+        self.path = path
+        self.replay = replay
+        self._lock = threading.Lock()
+        if replay:
+            import gzip
+
+            with gzip.open(path, "rt") as f:
+                archive = json.load(f)
+            if archive.get("version") != _ARCHIVE_VERSION:
+                raise Exception("Unsupported archive version in %s" % path)
+            self.now = datetime.strptime(archive["now"], "%Y-%m-%dT%H:%M:%S.%f")
+            self.responses = archive["responses"]
+        else:
+            self.now = datetime.utcnow()
+            self.responses = {}
+
+    def get(self, key):
+        if key not in self.responses:
+            raise Exception("No response recorded for %s in %s" % (key, self.path))
+        return self.responses[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self.responses[key] = value
+
+    def get_response(self, key):
+        """
+        Return the `requests.Response` recorded for `key`.
+        """
+        import requests
+
+        recorded = self.get(key)
+        resp = requests.Response()
+        resp.status_code = recorded["status"]
+        resp.url = recorded["url"]
+        resp.headers = requests.structures.CaseInsensitiveDict(recorded["headers"])
+        resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+        resp._content = recorded["content"].encode("utf-8", "surrogateescape")
+        return resp
+
+    def set_response(self, key, resp):
+        self.set(
+            key,
+            {
+                "status": resp.status_code,
+                "url": resp.url,
+                "headers": dict(resp.headers),
+                # keep any non UTF-8 bytes as is
+                "content": resp.content.decode("utf-8", "surrogateescape"),
+            },
+        )
+
+    def save(self):
+        if self.replay:
+            return
+        full_path = os.path.abspath(self.path)
+        print("Exporting recorded responses into file:\n{}\n".format(full_path))
+        import gzip
+
+        with gzip.open(full_path + ".tmp", "wt") as f:
+            json.dump(
+                {
+                    "version": _ARCHIVE_VERSION,
+                    "now": self.now.strftime("%Y-%m-%dT%H:%M:%S.%f"),
+                    "responses": self.responses,
+                },
+                f,
+                separators=(",", ":"),
+            )
+        os.replace(full_path + ".tmp", full_path)
+
+
+def get_archive(args):
+    if args.replay:
+        return ResponseArchive(args.replay, replay=True)
+    if args.record:
+        return ResponseArchive(args.record)
+    return None
+
+
+class GitHubSession(object):
+    """
+    HTTP session for the GitHub API and website, also used under a PyGithub
+    client with `attach`. It sends the requests with the `transport` session,
+    by default a `get_http_session` pooled session, and:
+    - tracks the rate limits and throttles the concurrency (see `RateLimiter`)
+    - retries the requests that were rate limited (403/429), after the
+      `Retry-After` delay, the rate limit reset, or a minute for the secondary
+      rate limits
+    - sends the API GET requests with the `If-None-Match` ETag from the `etags`
+      store (a `ResolverCache`) if any, so that unchanged responses (304) are
+      read from the store and do not count against the rate limit
+    - counts the requests, retries and conditional request hits in `profiler`
+    - records the responses into, or replays them from, a `ResponseArchive`
+
+    The waits that would cross its `deadline_at` time of `time.monotonic`, if
+    set, raise `DeadlineReached` instead.
+    """
+
+    def __init__(
+        self,
+        jobs=1,
+        etags=None,
+        max_retries=5,
+        api_url=_GITHUB_API_URL,
+        profiler=None,
+        archive=None,
+        transport=None,
+    ):
+        self.session = transport or get_http_session(jobs, max_retries)
+        self.jobs = jobs
+        self.etags = etags
+        self.max_retries = max_retries
+        self.api_url = api_url
+        self.profiler = profiler or NullProfiler()
+        self.archive = archive
+        self.deadline_at = None
+        self._limiters = {}
+        self._limiters_lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def utcnow(self):
+        """
+        Return the current UTC time, or the time of the recording when replaying
+        an archive.
+        """
+        if self.archive:
+            return self.archive.now
+        return datetime.utcnow()
+
+    def request(self, method, url, headers=None, **kwargs):
+        import requests
+
+        if not self.archive:
+            return self._request(method, url, headers, **kwargs)
+        prepared = requests.Request(method, url, params=kwargs.get("params"))
+        key = "%s %s %s" % (
+            method,
+            prepared.prepare().url,
+            json.dumps(kwargs.get("json"), sort_keys=True),
+        )
+        if self.archive.replay:
+            return self.archive.get_response(key)
+        resp = self._request(method, url, headers, **kwargs)
+        self.archive.set_response(key, resp)
+        return resp
+
+    def _request(self, method, url, headers=None, **kwargs):
+        import requests
+
+        headers = dict(headers or {})
+        key = None
+        stored = None
+        if self.etags and method == "GET" and url.startswith(self.api_url):
+            prepared = requests.Request(method, url, params=kwargs.get("params"))
+            key = "GET %s" % prepared.prepare().url
+            stored = self.etags.get_etag(key)
+            if stored:
+                headers["If-None-Match"] = stored[0]
+
+        limiter = self.get_limiter(url)
+        for attempt in range(self.max_retries + 1):
+            limiter.acquire(self.deadline_at)
+            resp = None
+            try:
+                resp = self.session.request(method, url, headers=headers, **kwargs)
+            finally:
+                limiter.release(resp.headers if resp is not None else None)
+            self.profiler.count_request(method, url, len(resp.content))
+            wait = get_retry_wait(
+                resp.status_code,
+                resp.headers,
+                attempt,
+                resp.text if resp.status_code in (403, 429) else "",
+            )
+            if wait is None or attempt == self.max_retries:
+                break
+            check_deadline(self.deadline_at, wait)
+            print("Rate limited on %s, retrying in %ss" % (url, int(wait)))
+            self.profiler.count("http.retries")
+            time.sleep(wait)
+
+        if stored and resp.status_code == 304:
+            self.profiler.count("http.not_modified")
+            resp = requests.Response()
+            resp.status_code = 200
+            resp.url = url
+            resp.headers = requests.structures.CaseInsensitiveDict(stored[1])
+            resp.encoding = requests.utils.get_encoding_from_headers(resp.headers)
+            resp._content = stored[2]
+        elif key and resp.status_code == 200 and resp.headers.get("etag"):
+            self.etags.set_etag(key, resp.headers["etag"], resp.headers, resp.content)
+        return resp
+
+    def get_limiter(self, url):
+        """
+        Return the `RateLimiter` of the rate limit that applies to `url`.
+        """
+        if url.startswith(get_graphql_url(self.api_url)):
+            resource = "graphql"
+        elif url.startswith(self.api_url) or url.startswith("/"):
+            resource = "core"
+        else:
+            # the website has no rate limit headers, only 429 responses
+            resource = "web"
+        with self._limiters_lock:
+            if resource not in self._limiters:
+                self._limiters[resource] = RateLimiter(self.jobs)
+            return self._limiters[resource]
+
+    def attach(self, g):
+        """
+        Apply the rate limiting, retries and conditional requests to all the API
+        calls of the PyGithub client `g`, and send them with the shared
+        transport instead of PyGithub's own connection pool.
+        """
+        from github import GithubException
+
+        requester = getattr(g, "_Github__requester", None)
+        if requester is None or not hasattr(requester, "_Requester__connectionClass"):
+            print(
+                "Warning: Unsupported PyGithub version, its API calls are sent "
+                "without gen3git's rate limiting and retries"
+            )
+            return
+        request = requester.requestJsonAndCheck
+        transport = self.session
+
+        def get_connection_class(base):
+            class Connection(base):
+                # PyGithub keeps a single connection, and stores each request on
+                # it in `request` until `getresponse` sends it: keep the request
+                # per thread, so that the requests of the thread pools do not
+                # get swapped
+                verb = _get_thread_local_property("verb")
+                url = _get_thread_local_property("url")
+                input = _get_thread_local_property("input")
+                headers = _get_thread_local_property("headers")
+                stream = _get_thread_local_property("stream")
+
+                def __init__(self, *args, **kwargs):
+                    self._local = threading.local()
+                    super(Connection, self).__init__(*args, **kwargs)
+                    self.session.close()
+                    self.session = transport
+
+                def close(self):
+                    # the transport outlives PyGithub's connections
+                    pass
+
+            return Connection
+
+        requester._Requester__connectionClass = get_connection_class(
+            requester._Requester__connectionClass
+        )
+
+        def requestJsonAndCheck(
+            verb, url, parameters=None, headers=None, input=None, **kwargs
+        ):
+            if not self.archive:
+                return send(verb, url, parameters, headers, input, **kwargs)
+            key = "github %s %s %s %s" % (
+                verb,
+                url,
+                json.dumps(parameters, sort_keys=True),
+                json.dumps(input, sort_keys=True),
+            )
+            if self.archive.replay:
+                recorded = self.archive.get(key)
+                if recorded["status"] >= 400:
+                    raise requester.createException(
+                        recorded["status"], recorded["headers"], recorded["data"]
+                    )
+                return recorded["headers"], recorded["data"]
+            try:
+                resp_headers, data = send(
+                    verb, url, parameters, headers, input, **kwargs
+                )
+            except GithubException as e:
+                self.archive.set(
+                    key, {"status": e.status, "headers": e.headers, "data": e.data}
+                )
+                raise
+            self.archive.set(
+                key, {"status": 200, "headers": resp_headers, "data": data}
+            )
+            return resp_headers, data
+
+        def send(verb, url, parameters=None, headers=None, input=None, **kwargs):
+            headers = dict(headers or {})
+            key = None
+            stored = None
+            if self.etags and verb == "GET":
+                key = "github %s %s" % (url, json.dumps(parameters, sort_keys=True))
+                stored = self.etags.get_etag(key)
+                if stored:
+                    headers["If-None-Match"] = stored[0]
+
+            limiter = self.get_limiter(url)
+            for attempt in range(self.max_retries + 1):
+                limiter.acquire(self.deadline_at)
+                resp_headers = None
+                try:
+                    resp_headers, data = request(
+                        verb, url, parameters, headers, input, **kwargs
+                    )
+                    break
+                except GithubException as e:
+                    resp_headers = e.headers or {}
+                    wait = get_retry_wait(
+                        e.status, resp_headers, attempt, json.dumps(e.data)
+                    )
+                    if wait is None or attempt == self.max_retries:
+                        raise
+                finally:
+                    limiter.release(resp_headers)
+                    self.profiler.count_request(
+                        verb, url, int((resp_headers or {}).get("content-length", 0))
+                    )
+                check_deadline(self.deadline_at, wait)
+                print("Rate limited on %s, retrying in %ss" % (url, int(wait)))
+                self.profiler.count("http.retries")
+                time.sleep(wait)
+
+            # PyGithub returns no data for the 304 responses
+            if stored and data is None:
+                self.profiler.count("http.not_modified")
+                return stored[1], json.loads(stored[2])
+            if key and resp_headers.get("etag"):
+                self.etags.set_etag(
+                    key, resp_headers["etag"], resp_headers, json.dumps(data)
+                )
+            return resp_headers, data
+
+        requester.requestJsonAndCheck = requestJsonAndCheck
+
+
+def _get_thread_local_property(name):
+    """
+    Return a property whose value is kept per thread, in the `_local`
+    `threading.local` of the object.
+    """
+    return property(
+        lambda self: getattr(self._local, name),
+        lambda self, value: setattr(self._local, name, value),
+    )
+
+
+class RateLimitBudget(object):
+    """
+    Spread the GitHub API rate limit of a client shared by several repositories:
+    before each repository, its share of the remaining calls is computed, and if
+    it is lower than `min_share`, wait for the rate limit to reset first. The
+    shares of the repositories left are then reserved on the `limiter` of the
+    API rate limit, see `RateLimiter`. If the rate limit is not available, e.g.
+    disabled on GitHub Enterprise Server, it is not spread.
+    """
+
+    def __init__(self, g, limiter, repos, min_share=100):
+        self.g = g
+        self.limiter = limiter
+        self.repos_left = repos
+        self.min_share = min_share
+        self.available = True
+
+    def wait_turn(self):
+        """
+        Wait for the turn of the next repository, and return its share of the
+        API calls, or None if the rate limit is not available.
+        """
+        from github import GithubException
+
+        if not self.available:
+            return None
+        try:
+            rate_limit = self.g.get_rate_limit()
+        except GithubException as e:
+            print("Rate limit not available, not spreading it: %s" % e)
+            self.available = False
+            return None
+        # older PyGithub versions have no `resources`
+        core = getattr(rate_limit, "resources", rate_limit).core
+        remaining, limit = core.remaining, core.limit
+        share = remaining // max(1, self.repos_left)
+        if share < self.min_share and remaining < limit:
+            wait = max(0, core.reset.timestamp() - time.time()) + 1
+            print(
+                "Only %s API calls left for %s repositories, waiting %ss for the "
+                "rate limit to reset" % (remaining, self.repos_left, int(wait))
+            )
+            time.sleep(wait)
+            remaining = limit
+            share = limit // max(1, self.repos_left)
+        self.repos_left -= 1
+        self.limiter.set_reserve(
+            share * self.repos_left, remaining, int(core.reset.timestamp())
+        )
+        return share
+
+
+def run_batch(args, transport=None):
+    """
+    Generate the release notes of every repository in the `args.manifest` file,
+    with a single GitHub client, HTTP connection pool and cache.
+    """
+    with open(args.manifest) as f:
+        entries = json.load(f)
+
+    profiler = get_profiler(args)
+    archive = get_archive(args)
+    cache = None if args.no_cache or archive else ResolverCache()
+    session = GitHubSession(
+        jobs=args.jobs,
+        etags=None if args.refresh_cache else cache,
+        api_url=args.github_api_url,
+        profiler=profiler,
+        archive=archive,
+        transport=transport,
+    )
+    g = get_github_client(args.github_access_token, args.github_api_url)
+    session.attach(g)
+    budget = RateLimitBudget(g, session.get_limiter(session.api_url), len(entries))
+    failed = []
+    for i, entry in enumerate(entries):
+        # default "gen" options, overridden by the batch and then the entry options
+        entry_args = get_command_line_args(["gen"])
+        for key, value in vars(args).items():
+            if key != "manifest":
+                setattr(entry_args, key, value)
+        for key, value in entry.items():
+            setattr(entry_args, key.replace("-", "_"), value)
+        if "file_name" not in entry and "file-name" not in entry:
+            entry_args.file_name = "%s_release_notes" % entry["repo"].split("/")[-1]
+
+        print("\n[%s/%s] %s" % (i + 1, len(entries), entry["repo"]))
+        try:
+            share = budget.wait_turn()
+            if share is not None:
+                print("~%s API calls available" % share)
+            with profiler.span("repo %s" % entry["repo"]):
+                generate_release_notes(entry_args, g, session, cache)
+        except Exception as e:
+            print("Failed to generate release notes for %s: %s" % (entry["repo"], e))
+            failed.append(entry["repo"])
+
+    if cache:
+        cache.close()
+    if archive:
+        archive.save()
+    profiler.save(args.trace_file)
+    if failed:
+        print("\nFailed repositories: %s" % ", ".join(failed))
+        sys.exit(1)
+
+
+class MemoryResolverCache(object):
+    """
+    In-memory counterpart of `ResolverCache` for `CachedResolver`: commit to
+    pull request mappings and merged pull requests, per repository. The pull
+    requests are not revalidated: `ReleaseNotesService` updates them from the
+    webhooks.
+    """
+
+    def __init__(self):
+        self._commit_prs = {}
+        self._pulls = {}
+        self._lock = threading.Lock()
+
+    def get_commit_prs(self, repo, shas):
+        with self._lock:
+            return {
+                sha: self._commit_prs[repo, sha]
+                for sha in shas
+                if (repo, sha) in self._commit_prs
+            }
+
+    def set_commit_prs(self, repo, commit_prs):
+        with self._lock:
+            for sha, prs in commit_prs.items():
+                self._commit_prs[repo, sha] = prs
+
+    def get_pulls(self, repo, numbers):
+        with self._lock:
+            return {
+                number: self._pulls[repo, number]
+                for number in numbers
+                if (repo, number) in self._pulls
+            }
+
+    def set_pulls(self, repo, pulls):
+        with self._lock:
+            for number, pull in pulls.items():
+                # pull requests that are not merged yet can still change
+                if not (pull.merged_at and pull.updated_at):
+                    continue
+                # older PyGithub versions return naive UTC datetimes
+                pull = pull._replace(
+                    merged_at=as_utc(pull.merged_at), updated_at=as_utc(pull.updated_at)
+                )
+                known = self._pulls.get((repo, number))
+                if not known or known.updated_at <= pull.updated_at:
+                    self._pulls[repo, number] = pull
+
+
+class ReleaseNotesService(object):
+    """
+    State of `gen3git serve`. Per repository, it keeps in memory:
+    - the repository and its `TagIndex`
+    - the pull requests and commit to pull request mappings, in a
+      `MemoryResolverCache`
+    - the release notes already rendered
+
+    GitHub webhooks (`handle_webhook`) add the merged pull requests and the
+    pushed commits to the cache, and invalidate the rendered release notes of
+    the repository (and its tags, when tags are pushed).
+    """
+
+    def __init__(self, args, g, session):
+        self.args = args
+        self.g = g
+        self.session = session
+        self.cache = MemoryResolverCache()
+        self._repos = {}
+        self._rendered = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def render(
+        self,
+        uri,
+        from_tag=None,
+        to_tag=None,
+        from_date=None,
+        to_date=None,
+        format_="markdown",
+    ):
+        """
+        Return the release notes of repository `uri` as a string, or None if
+        they cannot be generated (e.g. unknown tag).
+        """
+        if format_ not in ("markdown", "html", "text"):
+            raise ValueError("Unknown format: %s" % format_)
+        key = (uri, from_tag, to_tag, from_date, to_date, format_)
+        with self._lock:
+            if key in self._rendered:
+                return self._rendered[key]
+            version = self._versions.get(uri, 0)
+        repo, tags = self._get_repo(uri)
+
+        # default "gen" options, overridden by the service and render options
+        args = get_command_line_args(["gen"])
+        for name, value in vars(self.args).items():
+            # the rendered notes are kept: they cannot miss commits
+            if name not in ("host", "port", "webhook_secret", "deadline"):
+                setattr(args, name, value)
+        args.repo = uri
+        args.from_tag = from_tag
+        args.to_tag = to_tag
+        args.from_date = from_date
+        args.to_date = to_date
+        args.markdown = args.html = args.text = None
+        setattr(args, format_, True)
+
+        output = io.StringIO()
+        try:
+            generate_release_notes(
+                args,
+                self.g,
+                self.session,
+                self.cache,
+                repo=repo,
+                tags=tags,
+                output=output,
+            )
+        except ReleaseNotesError as e:
+            print(e)
+            return None
+        result = output.getvalue() or None
+        with self._lock:
+            # unless a webhook changed the repository in the meantime
+            if result and self._versions.get(uri, 0) == version:
+                self._rendered[key] = result
+        return result
+
+    def _get_repo(self, uri):
+        with self._lock:
+            repo, tags = self._repos.get(uri, (None, None))
+        if repo is None:
+            repo = self.g.get_repo(uri)
+        if tags is None:
+            tags = TagIndex(iter_pages(repo.get_tags(), self.args.jobs))
+        with self._lock:
+            self._repos[uri] = (repo, tags)
+        return repo, tags
+
+    def handle_webhook(self, event, payload):
+        """
+        Update the caches from a GitHub webhook `payload` of type `event`
+        ("push" or "pull_request", the other ones are ignored), and return a
+        summary of the changes.
+        """
+        if event not in ("push", "pull_request") or "repository" not in payload:
+            return {"ignored": event}
+        uri = payload["repository"]["full_name"]
+        summary = {"repo": uri, "event": event}
+        tags_changed = False
+
+        if event == "pull_request":
+            pull = payload["pull_request"]
+            if pull.get("merged_at"):
+                self.cache.set_pulls(
+                    uri,
+                    {
+                        pull["number"]: PullRequest(
+                            pull["body"],
+                            parse_github_date(pull["merged_at"]),
+                            parse_github_date(pull["updated_at"]),
+                        )
+                    },
+                )
+                if pull.get("merge_commit_sha"):
+                    self.cache.set_commit_prs(
+                        uri, {pull["merge_commit_sha"]: [pull["number"]]}
+                    )
+                summary["pulls"] = [pull["number"]]
+
+        elif payload.get("ref", "").startswith("refs/tags/"):
+            tags_changed = True
+            summary["tag"] = payload["ref"][len("refs/tags/") :]
+        else:
+            # the pull request of merge and squash commits is in their subject
+            commit_prs = {}
+            for commit in payload.get("commits") or []:
+                pr = get_subject_pr(commit["message"])
+                if pr:
+                    commit_prs[commit["id"]] = [pr]
+            self.cache.set_commit_prs(uri, commit_prs)
+            summary["commits"] = len(payload.get("commits") or [])
+
+        with self._lock:
+            self._versions[uri] = self._versions.get(uri, 0) + 1
+            for key in [key for key in self._rendered if key[0] == uri]:
+                del self._rendered[key]
+            if tags_changed and uri in self._repos:
+                self._repos[uri] = (self._repos[uri][0], None)
+        return summary
+
+
+def run_service(args, transport=None):
+    """
+    Serve `ReleaseNotesService` over HTTP until interrupted, see
+    `get_service_server`. Exit with status 1 if it cannot be served.
+    """
+    cache = None if args.no_cache else ResolverCache()
+    session = GitHubSession(
+        jobs=args.jobs,
+        etags=None if args.refresh_cache else cache,
+        api_url=args.github_api_url,
+        transport=transport,
+    )
+    g = get_github_client(args.github_access_token, args.github_api_url)
+    session.attach(g)
+    try:
+        server = get_service_server(args, ReleaseNotesService(args, g, session))
+    except ReleaseNotesError as e:
+        print(e)
+        if cache:
+            cache.close()
+        sys.exit(1)
+    print("Serving release notes on http://%s:%s" % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if cache:
+            cache.close()
+
+
+def get_service_server(args, service):
+    """
+    Return the HTTP server of `service` (a `ReleaseNotesService`) on `args.host`
+    and `args.port`:
+    - `GET /repos/<owner>/<repo>/notes?from_tag=&to_tag=&from_date=&to_date=&format=`
+      renders release notes ("markdown", "html" or "text" format)
+    - `POST /webhook` receives the GitHub webhooks
+
+    Raise a `ReleaseNotesError` if the webhooks could be sent unsigned from
+    another host: without `args.webhook_secret`, only a loopback `args.host` is
+    accepted.
+    """
+    import hashlib
+    import hmac
+    import ipaddress
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qs
+
+    if not args.webhook_secret:
+        try:
+            loopback = ipaddress.ip_address(args.host).is_loopback
+        except ValueError:
+            loopback = args.host == "localhost"
+        if not loopback:
+            raise ReleaseNotesError(
+                "A webhook secret is required to serve on %s: use --webhook-secret "
+                "or set GEN3GIT_WEBHOOK_SECRET" % args.host
+            )
+        print(
+            "Warning: No webhook secret, the webhooks are accepted without checking "
+            "their signature"
+        )
+
+    content_types = {
+        "markdown": "text/markdown",
+        "html": "text/html",
+        "text": "text/plain",
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            match = re.match(r"^/repos/([^/]+/[^/]+)/notes$", url.path)
+            if not match:
+                return self.reply(404, "Not found\n")
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            format_ = query.pop("format", "markdown")
+            if format_ not in content_types or set(query) - {
+                "from_tag",
+                "to_tag",
+                "from_date",
+                "to_date",
+            }:
+                return self.reply(400, "Invalid parameters\n")
+            try:
+                notes = service.render(match.group(1), format_=format_, **query)
+            except Exception as e:
+                return self.reply(500, "Failed to generate release notes: %s\n" % e)
+            if notes is None:
+                return self.reply(404, "Cannot generate these release notes\n")
+            self.reply(200, notes, content_types[format_])
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/webhook":
+                return self.reply(404, "Not found\n")
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            if args.webhook_secret:
+                signature = (
+                    "sha256="
+                    + hmac.new(
+                        args.webhook_secret.encode(), body, hashlib.sha256
+                    ).hexdigest()
+                )
+                if not hmac.compare_digest(
+                    signature, self.headers.get("X-Hub-Signature-256", "")
+                ):
+                    return self.reply(401, "Invalid signature\n")
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return self.reply(400, "Invalid JSON\n")
+            try:
+                summary = service.handle_webhook(
+                    self.headers.get("X-GitHub-Event"), payload
+                )
+            except Exception as e:
+                return self.reply(500, "Failed to handle the webhook: %s\n" % e)
+            self.reply(200, json.dumps(summary) + "\n", "application/json")
+
+        def reply(self, status, text, content_type="text/plain"):
+            body = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type + "; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+class ParseRules(object):
+    """
+    Rules to parse PR descriptions into release notes, compiled once:
+    - `header_prefix`: lines starting with it are category headers
+    - `skip_lines`: lines to ignore, once stripped of their bullet point
+    - `skip_contains`: ignore the lines containing any of these strings
+    - `skip_patterns`: ignore the lines matching any of these regexes, from the
+      start of the line
+    - `bots`: `{marker: {"category": category, "prefix": prefix}}`. Only the
+      lines starting with `prefix` of the PR descriptions containing `marker`
+      (such as dependabot PRs) are kept, in `category`.
+    """
+
+    def __init__(
+        self,
+        header_prefix="### ",
+        skip_lines=(),
+        skip_contains=(),
+        skip_patterns=(),
+        bots=None,
+    ):
+        self.header_prefix = header_prefix
+        self.header_marker = header_prefix.strip()
+        self.skip_lines = frozenset(skip_lines)
+        self.skip_contains = tuple(skip_contains)
+        self.skip_patterns = tuple(skip_patterns)
+        self.bots = dict(bots or {})
+        self._skip_regexes = [re.compile(pattern) for pattern in self.skip_patterns]
+
+    def extend(self, config):
+        """
+        Return new rules with the skip rules and bots of the `config` dict (same
+        keys as the constructor arguments) added to these ones.
+        """
+        bots = dict(self.bots)
+        bots.update(config.get("bots", {}))
+        return ParseRules(
+            header_prefix=config.get("header_prefix", self.header_prefix),
+            skip_lines=self.skip_lines.union(config.get("skip_lines", [])),
+            skip_contains=self.skip_contains + tuple(config.get("skip_contains", [])),
+            skip_patterns=self.skip_patterns + tuple(config.get("skip_patterns", [])),
+            bots=bots,
+        )
+
+    @staticmethod
+    def load(path):
+        """
+        Return the default rules extended with the rules of a JSON config file.
+        """
+        with open(path) as f:
+            return DEFAULT_PARSE_RULES.extend(json.load(f))
+
+    def skip(self, line):
+        if line in self.skip_lines or (
+            line.startswith("<!--") and line.endswith("-->")
+        ):
+            return True
+        for text in self.skip_contains:
+            if text in line:
+                return True
+        for regex in self._skip_regexes:
+            if regex.match(line):
+                return True
+        return False
+
+    def get_bot(self, body):
+        for marker, bot in self.bots.items():
+            if marker in body:
+                return bot
+        return None
+
+
+DEFAULT_PARSE_RULES = ParseRules(
+    skip_lines=[
+        "Description about what this pull request does.",
+        "Implemented XXX",
+        "This pull request was generated automatically.",
+        "None",
+    ],
+    skip_contains=["Please make sure to follow the [DEV guidelines]"],
+    # ignore github autolinks
+    skip_patterns=[r"^\[.*\]: http.*$"],
+    bots={
+        "Dependabot commands and options": {
+            "category": "dependency updates",
+            "prefix": "Bumps",
+        }
+    },
+)
+
+
+def parse_pr_bodies(
+    desc_bodies,
+    release_notes=None,
+    repo_uri=None,
+    link_type="markdown",
+    rules=None,
+    github_url=_GITHUB_URL,
+):
+    """
+    Parse many PR descriptions at once: `desc_bodies` is an iterable of
+    `(ref, ref_type, body)` tuples. Return the release notes.
+    """
+    if release_notes is None:
+        release_notes = {"general updates": []}
+    for ref, ref_type, body in desc_bodies:
+        parse_pr_body(
+            body, release_notes, ref, ref_type, repo_uri, link_type, rules, github_url
+        )
+    return release_notes
 
 
 def parse_pr_body(
@@ -527,63 +3622,94 @@ def parse_pr_body(
     ref_type=None,
     repo_uri=None,
     link_type="markdown",
+    rules=None,
+    github_url=_GITHUB_URL,
 ):
-    # by default, internal markdown (markdown link to a PR in the same repo)
-    ref_link = "#{}".format(ref)
-    if repo_uri and ref_type == "pr":
-        # this works for PR numbers, but not for commit hashes
-        if link_type == "markdown":
-            # markdown link to a PR in the same or a different repo
-            ref_link = "[#{}](https://github.com/{}/pull/{})".format(ref, repo_uri, ref)
-        elif link_type == "html":  # to send in emails
-            ref_link = '<a href="https://github.com/{}/pull/{}">#{}</a>'.format(
-                repo_uri, ref, ref
-            )
-        elif link_type == "slack":  # to post on slack
-            ref_link = "<https://github.com/{}/pull/{}|#{}>".format(repo_uri, ref, ref)
-        elif link_type == "text":  # to display as plain text
-            ref_link = "https://github.com/{}/pull/{}".format(repo_uri, ref)
+    ref_link = get_ref_link(ref, ref_type, repo_uri, link_type, github_url)
+
+    def get_line(line, linked):
+        # the lines of bot PRs only end with the PR number
+        return "%s (%s)" % (line, ref_link) if linked else "%s (#%s)" % (line, ref)
+
+    return _parse_pr_body(body, release_notes, rules, get_line)
+
+
+def parse_pr_entries(
+    body, release_notes, ref, ref_type=None, rules=None, merged_at=None
+):
+    """
+    Parse a PR description like `parse_pr_body`, but add the release notes as
+    `Entry`s, whose links are built when they are rendered.
+    """
+
+    def get_line(line, linked):
+        return Entry(line, ref, ref_type, merged_at, linked)
+
+    return _parse_pr_body(body, release_notes, rules, get_line)
 
+
+def _parse_pr_body(body, release_notes, rules, get_line):
+    """
+    Add the release notes of a PR description to `release_notes`, as the
+    `get_line(line, linked)` of each line: `linked` is False for the lines of
+    bot PRs, which are kept as is.
+    """
+    rules = rules or DEFAULT_PARSE_RULES
     category = "general updates"
+    release_notes.setdefault(category, [])
     if body:
 
-        # handle dependabot PRs
-        if "Dependabot commands and options" in body:
-            category = "dependency updates"
+        # handle bot PRs, such as dependabot's
+        bot = rules.get_bot(body)
+        if bot:
+            category = sys.intern(bot["category"])
             for line in body.splitlines():
-                if line.startswith("Bumps"):
-                    release_notes.setdefault(category, []).append(
-                        "%s (#%s)" % (line, ref)
-                    )
+                if line.startswith(bot["prefix"]):
+                    release_notes.setdefault(category, []).append(get_line(line, False))
             return release_notes
 
         for line in body.splitlines():
-            if line.startswith("### "):
-                category = line.replace("###", "").strip().lower()
+            if line.startswith(rules.header_prefix):
+                # the same few categories are in every PR
+                category = sys.intern(
+                    line.replace(rules.header_marker, "").strip().lower()
+                )
                 if category not in release_notes:
                     release_notes[category] = []
             elif line:
-                line = parse_line(line)
+                line = parse_line(line, rules)
                 if line:
-                    release_notes[category].append("%s (%s)" % (line, ref_link))
+                    release_notes[category].append(get_line(line, True))
             else:
                 continue
 
     return release_notes
 
 
-def parse_line(line):
+def get_ref_link(
+    ref, ref_type=None, repo_uri=None, link_type="markdown", github_url=_GITHUB_URL
+):
+    # by default, internal markdown (markdown link to a PR in the same repo)
+    ref_link = "#{}".format(ref)
+    if repo_uri and ref_type == "pr":
+        # this works for PR numbers, but not for commit hashes
+        url = "{}/{}/pull/{}".format(github_url.rstrip("/"), repo_uri, ref)
+        if link_type == "markdown":
+            # markdown link to a PR in the same or a different repo
+            ref_link = "[#{}]({})".format(ref, url)
+        elif link_type == "html":  # to send in emails
+            ref_link = '<a href="{}">#{}</a>'.format(url, ref)
+        elif link_type == "slack":  # to post on slack
+            ref_link = "<{}|#{}>".format(url, ref)
+        elif link_type == "text":  # to display as plain text
+            ref_link = url
+    return ref_link
+
+
+def parse_line(line, rules=None):
     line = line.strip().lstrip("*").lstrip().lstrip("-").lstrip().lstrip("-").lstrip()
 
-    if (
-        "Please make sure to follow the [DEV guidelines]" in line
-        or line == "Description about what this pull request does."
-        or line == "Implemented XXX"
-        or line == "This pull request was generated automatically."
-        or line == "None"
-        or (line.startswith("<!--") and line.endswith("-->"))
-        or re.compile(r"^\[.*\]: http.*$").match(line)  # ignore github autolinks
-    ):
+    if (rules or DEFAULT_PARSE_RULES).skip(line):
         return None
 
     return line
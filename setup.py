@@ -26,11 +26,12 @@ setup(
     py_modules=["gen3git"],
     install_requires=[
         'enum;python_version<"3.4"',
-        "PyGithub",
+        # `PaginatedList.get_page` on the compared commits, and the private
+        # attributes of the requester used by `GitHubSession.attach`
+        "PyGithub>=2.2.0,<3",
         "requests",
         "gitpython",
         "packaging",
-        "pytz",
     ],
     entry_points={"console_scripts": ["gen3git=gen3git:main"]},
 )
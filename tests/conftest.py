@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "benchmarks"))
+
+import gen3git  # noqa: E402
+from fake_github import FakeGitHub, FakeRepository  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """
+    Run each test in its own directory, with its own cache and no token.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.delenv("GH_TOKEN", raising=False)
+    monkeypatch.delenv("GITHUB_TOKEN", raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def fake_repo():
+    # tags 1.0.0, 1.0.1 and 1.0.2 on commits 0, 50 and 100
+    return FakeRepository(commits=120, tag_every=50)
+
+
+@pytest.fixture
+def fake(fake_repo):
+    with FakeGitHub([fake_repo]) as fake:
+        yield fake
+
+
+@pytest.fixture
+def run(fake):
+    """
+    Return a function that runs `gen3git.main` with the given arguments against
+    the fake GitHub, and returns its result.
+    """
+
+    def run(*argv):
+        args = gen3git.get_command_line_args(
+            [
+                "--github-url",
+                fake.url,
+                "--github-api-url",
+                fake.url,
+                "--repo",
+                "org/repo",
+            ]
+            + list(argv)
+        )
+        return gen3git.main(args)
+
+    return run
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
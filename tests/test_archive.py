@@ -0,0 +1,37 @@
+import gzip
+import json
+
+import pytest
+
+from conftest import read
+
+GEN = ["gen", "--to-tag", "1.0.1", "--markdown", "--file-name"]
+
+
+def test_replay_without_network(fake, run):
+    run("--from-tag", "1.0.0", "--record", "run.json.gz", *GEN, "recorded")
+    fake.counts.clear()
+
+    run("--from-tag", "1.0.0", "--replay", "run.json.gz", *GEN, "replayed")
+
+    assert sum(fake.counts.values()) == 0
+    assert read("replayed.md") == read("recorded.md")
+    assert "Feature number 25" in read("replayed.md")
+
+
+def test_replay_of_a_request_not_recorded(fake, run):
+    run("--from-tag", "1.0.0", "--record", "run.json.gz", *GEN, "recorded")
+    fake.counts.clear()
+
+    # a different range than the recorded one, not requested from GitHub either
+    with pytest.raises(Exception, match="No response recorded for"):
+        run("--from-tag", "1.0.1", "--replay", "run.json.gz", *GEN[:2], "1.0.2")
+    assert sum(fake.counts.values()) == 0
+
+
+def test_replay_of_an_unsupported_archive(run):
+    with gzip.open("run.json.gz", "wt") as f:
+        json.dump({"version": 0, "now": "", "responses": {}}, f)
+
+    with pytest.raises(Exception, match="Unsupported archive version"):
+        run("--replay", "run.json.gz", *GEN, "replayed")
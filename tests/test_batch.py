@@ -0,0 +1,105 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import gen3git
+
+
+def test_batch_fails_on_unknown_tag(fake, run, capsys):
+    fake.rate_limit = {
+        "limit": 5000,
+        "remaining": 3000,
+        "reset": int(time.time()) + 3600,
+    }
+    with open("manifest.json", "w") as f:
+        json.dump(
+            [
+                {
+                    "repo": "org/repo",
+                    "from_tag": "1.0.0",
+                    "to_tag": "1.0.1",
+                    "markdown": True,
+                    "file_name": "good",
+                },
+                {"repo": "org/repo", "to_tag": "9.9.9", "file_name": "bad"},
+            ],
+            f,
+        )
+
+    with pytest.raises(SystemExit) as e:
+        run("batch", "manifest.json")
+
+    assert e.value.code == 1
+    out = capsys.readouterr().out
+    assert "[1/2] org/repo\n~1500 API calls available" in out
+    assert "Cannot find tag: 9.9.9" in out
+    assert "Failed repositories: org/repo" in out
+    assert os.path.exists("good.md")
+    assert not os.path.exists("bad.txt")
+
+
+def test_batch_without_rate_limit(fake, run, capsys):
+    fake.rate_limit_disabled = True
+    with open("manifest.json", "w") as f:
+        json.dump(
+            [
+                {"repo": "org/repo", "from_tag": "1.0.0", "file_name": "first"},
+                {"repo": "org/repo", "from_tag": "1.0.1", "file_name": "second"},
+            ],
+            f,
+        )
+
+    run("batch", "manifest.json")
+
+    out = capsys.readouterr().out
+    assert out.count("Rate limit not available") == 1
+    assert "API calls available" not in out
+    assert os.path.exists("first.txt")
+    assert os.path.exists("second.txt")
+
+
+def test_gen_fails_on_unknown_tag(fake, run):
+    with pytest.raises(SystemExit) as e:
+        run("gen", "--to-tag", "9.9.9")
+    assert e.value.code == 1
+
+
+def test_budget_reserves_the_share_of_the_other_repositories(fake):
+    fake.rate_limit = {
+        "limit": 5000,
+        "remaining": 3000,
+        "reset": int(time.time()) + 3600,
+    }
+    session = gen3git.GitHubSession(api_url=fake.url)
+    g = gen3git.get_github_client(None, fake.url)
+    session.attach(g)
+    limiter = session.get_limiter(fake.url)
+    budget = gen3git.RateLimitBudget(g, limiter, 3)
+
+    assert budget.wait_turn() == 1000
+    assert limiter.reserve == 2000
+    # no call was used in the meantime
+    assert budget.wait_turn() == 1500
+    assert limiter.reserve == 1500
+    assert budget.wait_turn() == 3000
+    assert limiter.reserve == 0
+
+
+def test_rate_limiter_waits_for_the_reset_at_the_reserve():
+    limiter = gen3git.RateLimiter(4)
+    limiter.set_reserve(50, 51, int(time.time()) + 1)
+    limiter.acquire()
+    limiter.release({"x-ratelimit-remaining": "50"})
+    acquired = threading.Event()
+
+    def acquire():
+        limiter.acquire()
+        acquired.set()
+
+    threading.Thread(target=acquire, daemon=True).start()
+
+    assert not acquired.wait(0.5)
+    assert acquired.wait(3)
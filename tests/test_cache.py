@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import gen3git
+from conftest import read
+
+
+def gen(run, *argv, to_tag="1.0.1"):
+    run(
+        "--from-tag",
+        "1.0.0",
+        *argv,
+        "gen",
+        *(["--to-tag", to_tag] if to_tag else []),
+        "--markdown",
+        "--file-name",
+        "notes",
+    )
+    return read("notes.md")
+
+
+def test_second_run_is_served_from_the_cache(fake, run):
+    notes = gen(run)
+    fake.counts.clear()
+
+    assert gen(run) == notes
+    # the pull requests are validated with a single listing
+    assert fake.counts["pulls"] == 1
+    assert fake.counts["pull"] == 0
+    assert fake.counts["branch_commits"] == 0
+
+
+def test_edited_pull_request_is_not_stale(fake, fake_repo, run):
+    notes = gen(run)
+    assert "Feature number 10," in notes
+
+    pull = fake_repo.pulls[10]
+    pull["body"] = pull["body"].replace("Feature number 10,", "Edited feature 10,")
+    pull["updated_at"] = datetime.utcnow()
+    fake.counts.clear()
+    notes = gen(run)
+
+    assert "Edited feature 10," in notes
+    assert "Feature number 10," not in notes
+    assert fake.counts["pulls"] == 1
+    assert fake.counts["pull"] == 0
+
+
+def test_pull_requests_cached_without_validation_are_dropped(fake, fake_repo, run):
+    cache = gen3git.ResolverCache()
+    stale = fake_repo.pulls[10]
+    cache.set_pulls(
+        "org/repo",
+        {10: gen3git.PullRequest("### Features\n- Stale", *[stale["merged_at"]] * 2)},
+    )
+    cache.close()
+
+    notes = gen(run)
+
+    assert "Stale" not in notes
+    assert "Feature number 10," in notes
+    assert fake.counts["pulls"] == 0
+    assert fake.counts["pull"] == 25
+
+
+def test_commits_without_pull_request(fake, fake_repo, run):
+    gen(run)
+    assert fake.counts["branch_commits"] == 50
+
+    # commits 5, 10, ..., 50 have no pull request, and are in tag 1.0.1
+    fake.counts.clear()
+    gen(run)
+    assert fake.counts["branch_commits"] == 0
+
+    # the 13 ones after tag 1.0.1 may be associated with one later
+    gen(run, to_tag=None)
+    fake.counts.clear()
+    gen(run, to_tag=None)
+    assert fake.counts["branch_commits"] == 13
+
+
+def test_pulls_are_kept_across_runs(workdir):
+    pull = gen3git.PullRequest("body", datetime(2020, 1, 1), datetime(2020, 1, 2))
+    cache = gen3git.ResolverCache()
+    cache.set_pulls("org/repo", {1: pull})
+    cache.close()
+
+    cache = gen3git.ResolverCache()
+    assert cache.get_pulls("org/repo", [1, 2]) == {
+        1: pull._replace(
+            merged_at=gen3git.as_utc(pull.merged_at),
+            updated_at=gen3git.as_utc(pull.updated_at),
+        )
+    }
+    cache.close()
@@ -0,0 +1,199 @@
+import time
+
+import pytest
+
+import gen3git
+from conftest import read
+
+KEY = {"repo": "org/repo"}
+
+
+def get_commits(start, stop):
+    # newest first
+    return [("%040x" % i, "commit %s" % i) for i in reversed(range(start, stop))]
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def resolve_commits(commits, checkpoint=None, deadline=None):
+    """
+    Resolve the commits with a chunk of 10 commits taking 10 seconds, and
+    return the `ResumableCommits` and the release notes.
+    """
+    clock = Clock()
+    resumable = gen3git.ResumableCommits(
+        commits,
+        checkpoint,
+        deadline_at=deadline,
+        chunk_size=10,
+        clock=clock,
+    )
+    release_notes = {"general updates": []}
+
+    def resolve(chunk):
+        for sha, message in chunk:
+            resumable.prs.add(int(sha, 16))
+            release_notes["general updates"].append(
+                gen3git.Entry(message, sha, "commit", None, None)
+            )
+        clock.now += len(chunk)
+
+    resumable.run(resolve, release_notes)
+    return resumable, release_notes
+
+
+def save_and_load(resumable, release_notes):
+    resumable.save("checkpoint.json", KEY, release_notes)
+    return gen3git.load_checkpoint("checkpoint.json", KEY)
+
+
+def test_no_deadline():
+    resumable, release_notes = resolve_commits(get_commits(0, 25))
+
+    assert resumable.pending is None
+    assert resumable.resolved == 25
+    assert resumable.first_sha == "%040x" % 24
+    assert [entry.line for entry in release_notes["general updates"]] == [
+        "commit %s" % i for i in reversed(range(25))
+    ]
+
+
+def test_deadline_in_listing():
+    # 3 chunks before the deadline, the 4th one would end after it
+    resumable, release_notes = resolve_commits(get_commits(0, 100), deadline=35)
+
+    assert resumable.resolved == 30
+    assert resumable.pending == []
+    assert resumable.resume_sha == "%040x" % 70
+    checkpoint = save_and_load(resumable, release_notes)
+
+    # 20 new commits, then 1 more chunk of the listing after the checkpoint
+    resumable, release_notes = resolve_commits(
+        get_commits(0, 120), checkpoint, deadline=35
+    )
+
+    assert resumable.resolved == 60
+    assert resumable.first_sha == "%040x" % 119
+    assert resumable.pending == []
+    assert resumable.resume_sha == "%040x" % 60
+    checkpoint = save_and_load(resumable, release_notes)
+
+    resumable, release_notes = resolve_commits(get_commits(0, 120), checkpoint)
+    full, full_release_notes = resolve_commits(get_commits(0, 120))
+
+    assert resumable.pending is None
+    assert resumable.resolved == full.resolved == 120
+    assert resumable.prs == full.prs
+    assert release_notes == full_release_notes
+
+
+def test_deadline_in_new_commits():
+    resumable, release_notes = resolve_commits(get_commits(0, 100), deadline=35)
+    checkpoint = save_and_load(resumable, release_notes)
+
+    # the deadline is reached in the 50 new commits
+    resumable, release_notes = resolve_commits(
+        get_commits(0, 150), checkpoint, deadline=25
+    )
+
+    assert resumable.resolved == 50
+    assert [sha for sha, _ in resumable.pending] == [
+        "%040x" % i for i in reversed(range(100, 130))
+    ]
+    # the listing is resumed where the first run stopped
+    assert resumable.resume_sha == "%040x" % 70
+    checkpoint = save_and_load(resumable, release_notes)
+
+    resumable, release_notes = resolve_commits(get_commits(0, 150), checkpoint)
+    full, full_release_notes = resolve_commits(get_commits(0, 150))
+
+    assert resumable.pending is None
+    assert resumable.resolved == full.resolved == 150
+    assert resumable.first_sha == full.first_sha
+    # the notes resolved later go after the notes of the checkpoint
+    assert sorted(release_notes["general updates"]) == sorted(
+        full_release_notes["general updates"]
+    )
+
+
+def test_checkpoint_not_in_range():
+    resumable, release_notes = resolve_commits(get_commits(0, 100), deadline=35)
+    checkpoint = save_and_load(resumable, release_notes)
+
+    resumable, release_notes = resolve_commits(get_commits(200, 250), checkpoint)
+
+    assert resumable.checkpoint is None
+    assert resumable.resolved == 50
+    assert len(release_notes["general updates"]) == 50
+
+
+def test_gen_resumes_after_deadline(fake, run):
+    options = ["--from-tag", "1.0.0", "--no-cache"]
+    gen = ["gen", "--to-tag", "1.0.1", "--markdown", "--incremental"]
+    # the deadline is reached before the first chunk
+    run(*options, "--deadline", "0.000001", *gen)
+
+    assert "50 commits unresolved" in read("release_notes.md")
+
+    run(*options, *gen)
+    run(*options, *gen[:-1], "--file-name", "full")
+
+    assert read("release_notes.md") == read("full.md")
+    assert "Feature number 25" in read("full.md")
+
+
+def test_rate_limit_wait_does_not_cross_the_deadline():
+    limiter = gen3git.RateLimiter()
+    limiter.set_reserve(0, 0, int(time.time()) + 3600)
+
+    with pytest.raises(gen3git.DeadlineReached):
+        limiter.acquire(time.monotonic() + 60)
+
+
+def test_gen_stops_at_the_deadline_when_rate_limited(fake, run):
+    options = ["--from-tag", "1.0.0", "--no-cache", "--jobs", "1"]
+    gen = ["gen", "--to-tag", "1.0.1", "--markdown", "--incremental"]
+    # exhausted after some of the pull requests, until long after the deadline
+    fake.rate_limit = {"limit": 5000, "remaining": 20, "reset": int(time.time()) + 3600}
+    started = time.monotonic()
+    run(*options, "--deadline", "60", *gen)
+
+    assert time.monotonic() - started < 30
+    assert "commits unresolved" in read("release_notes.md")
+
+    fake.rate_limit = None
+    run(*options, *gen)
+    run(*options, *gen[:-1], "--file-name", "full")
+
+    assert read("release_notes.md") == read("full.md")
+
+
+def test_release_saves_a_checkpoint(fake, run, workdir, capsys):
+    options = ["--from-tag", "1.0.0", "--no-cache", "--jobs", "1", "--deadline", "60"]
+    release = ["release", "--release-tag", "1.0.1"]
+    fake.rate_limit = {"limit": 5000, "remaining": 20, "reset": int(time.time()) + 3600}
+    # the release cannot be updated before the deadline either
+    with pytest.raises(SystemExit):
+        run(*options, *release)
+
+    path = workdir / "cache" / "gen3git" / "checkpoints" / "org_repo_1.0.1.json"
+    assert path.exists()
+    assert "commits unresolved" in capsys.readouterr().out
+
+    fake.rate_limit = None
+    run(*options, *release)
+
+    out = capsys.readouterr().out
+    assert "Resuming from checkpoint" in out
+    assert "commits unresolved" not in out
+
+
+def test_tag_rejects_the_deadline(run):
+    with pytest.raises(SystemExit):
+        run("--deadline", "60", "tag", "1.0.3")
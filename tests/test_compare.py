@@ -0,0 +1,48 @@
+import os
+
+import gen3git
+from conftest import read
+
+
+def gen(run, file_name):
+    run(
+        "--from-tag",
+        "1.0.0",
+        "--no-cache",
+        "gen",
+        "--to-tag",
+        "1.0.2",
+        "--markdown",
+        "--file-name",
+        file_name,
+    )
+
+
+def test_gen_above_the_compare_cap(fake, run, monkeypatch):
+    gen(run, "compare")
+    assert fake.counts["commits"] == 0
+
+    fake.compare_max_commits = 30
+    monkeypatch.setattr(gen3git, "_COMPARE_MAX_COMMITS", 30)
+    gen(run, "listing")
+
+    assert fake.counts["commits"] > 0
+    assert read("listing.md") == read("compare.md")
+    assert "Feature number 1" in read("listing.md")
+    assert "Feature number 50" in read("listing.md")
+
+
+def test_backfill_above_the_compare_cap(fake, run, monkeypatch):
+    backfill = ["--from-tag", "1.0.0", "--no-cache", "backfill", "--to-tag", "1.0.2"]
+    run(*backfill, "--markdown", "--output-dir", "compare")
+
+    fake.compare_max_commits = 30
+    monkeypatch.setattr(gen3git, "_COMPARE_MAX_COMMITS", 30)
+    run(*backfill, "--markdown", "--output-dir", "listing")
+
+    assert fake.counts["commits"] > 0
+    assert sorted(os.listdir("listing")) == ["1.0.1.md", "1.0.2.md"]
+    for name in os.listdir("listing"):
+        assert read(os.path.join("listing", name)) == read(
+            os.path.join("compare", name)
+        )
@@ -0,0 +1,55 @@
+import json
+
+import gen3git
+from conftest import read
+
+
+def test_graphql_url():
+    assert gen3git.get_graphql_url("https://api.github.com") == (
+        "https://api.github.com/graphql"
+    )
+    assert gen3git.get_graphql_url("https://ghe.example.com/api/v3") == (
+        "https://ghe.example.com/api/graphql"
+    )
+    assert gen3git.get_graphql_url("https://ghe.example.com/api/v3/") == (
+        "https://ghe.example.com/api/graphql"
+    )
+
+
+def test_graphql_rate_limit_on_enterprise():
+    session = gen3git.GitHubSession(api_url="https://ghe.example.com/api/v3")
+
+    assert session.get_limiter("https://ghe.example.com/api/graphql") is not (
+        session.get_limiter("https://ghe.example.com/api/v3/repos/org/repo")
+    )
+    assert session.get_limiter("https://ghe.example.com/api/graphql") is not (
+        session.get_limiter("https://ghe.example.com/org/repo/branch_commits/1")
+    )
+
+
+def test_pull_request_links(fake, run):
+    run(
+        "--from-tag",
+        "1.0.0",
+        "gen",
+        "--to-tag",
+        "1.0.1",
+        "--markdown",
+        "--file-name",
+        "notes",
+        "--artifact",
+        "notes.json",
+    )
+
+    link = "[#10](%s/org/repo/pull/10)" % fake.url
+    assert link in read("notes.md")
+    assert "https://github.com" not in read("notes.md")
+    with open("notes.json") as f:
+        assert json.load(f)["github_url"] == fake.url
+
+    gen3git.main(
+        gen3git.get_command_line_args(
+            ["render", "notes.json", "--markdown", "--file-name", "rendered"]
+        )
+    )
+    assert link in read("rendered.md")
@@ -0,0 +1,92 @@
+import json
+import threading
+from urllib.parse import urlparse
+
+import gen3git
+
+
+def get_client(fake, session):
+    g = gen3git.get_github_client(None, fake.url)
+    session.attach(g)
+    return g
+
+
+def test_connection_keeps_requests_per_thread(fake, fake_repo):
+    session = gen3git.GitHubSession(jobs=2, api_url=fake.url)
+    requester = get_client(fake, session)._Github__requester
+    url = urlparse(fake.url)
+    connection = requester._Requester__connectionClass(url.hostname, url.port)
+    barrier = threading.Barrier(2)
+    bodies = {}
+
+    def get_pull(number, first):
+        # both threads store their request before either sends it
+        if not first:
+            barrier.wait()
+        connection.request("GET", "/repos/org/repo/pulls/%s" % number, None, {})
+        if first:
+            barrier.wait()
+        barrier.wait()
+        bodies[number] = json.loads(connection.getresponse().read())
+
+    threads = [
+        threading.Thread(target=get_pull, args=(1, True)),
+        threading.Thread(target=get_pull, args=(2, False)),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert bodies[1]["number"] == 1
+    assert bodies[2]["number"] == 2
+
+
+def test_secondary_rate_limit_is_retried(fake, fake_repo, monkeypatch):
+    waits = []
+    monkeypatch.setattr(gen3git.time, "sleep", waits.append)
+    session = gen3git.GitHubSession(jobs=1, api_url=fake.url)
+    g = get_client(fake, session)
+
+    # through PyGithub
+    fake.secondary_rate_limits = 2
+    assert g.get_repo("org/repo").get_pull(1).body == fake_repo.pulls[1]["body"]
+    # through the session
+    fake.secondary_rate_limits = 1
+    resp = session.get(fake.url + "/repos/org/repo/pulls/2")
+    assert resp.json()["body"] == fake_repo.pulls[2]["body"]
+
+    assert fake.counts["secondary_rate_limit"] == 3
+    assert len(waits) == 3
+    assert all(wait >= 60 for wait in waits)
+
+
+def test_other_403_is_not_retried():
+    assert gen3git.get_retry_wait(403, {}, 0, '{"message": "Forbidden"}') is None
+    assert gen3git.get_retry_wait(403, {"retry-after": "5"}, 0) < 6
+    assert gen3git.get_retry_wait(429, {}, 0) < 60
+
+
+def test_token_is_not_replaced_by_netrc(fake, fake_repo, workdir, monkeypatch):
+    netrc = workdir / "netrc"
+    netrc.write_text("machine 127.0.0.1 login user password secret\n")
+    monkeypatch.setenv("NETRC", str(netrc))
+    session = gen3git.GitHubSession(jobs=1, api_url=fake.url)
+    g = gen3git.get_github_client("token", fake.url)
+    session.attach(g)
+
+    g.get_repo("org/repo").get_pull(1)
+    session.get(
+        "%s/org/repo/branch_commits/%s" % (fake.url, fake_repo.commits[1]["sha"])
+    )
+
+    assert fake.authorizations == {"token token": 2, None: 1}
+
+
+def test_attach_unsupported_pygithub(capsys):
+    session = gen3git.GitHubSession(jobs=1)
+
+    # without the private attributes of the requester
+    session.attach(object())
+
+    assert "Unsupported PyGithub version" in capsys.readouterr().out
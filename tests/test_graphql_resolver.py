@@ -0,0 +1,107 @@
+import pytest
+
+import gen3git
+from conftest import read
+from fake_github import FakeRepository
+
+
+def get_resolver(fake, batch_size=100):
+    return gen3git.GraphQLResolver(
+        None,
+        "org/repo",
+        "token",
+        jobs=4,
+        session=gen3git.GitHubSession(jobs=4, api_url=fake.url),
+        batch_size=batch_size,
+        graphql_url=fake.url + "/graphql",
+    )
+
+
+@pytest.fixture
+def fake_repo():
+    return FakeRepository(commits=251, tag_every=250)
+
+
+def test_batches_of_100_commits(fake, fake_repo):
+    resolver = get_resolver(fake)
+    shas = [commit["sha"] for commit in reversed(fake_repo.commits[1:])]
+
+    commit_prs = resolver.get_commit_prs(shas)
+
+    assert sorted(fake.graphql_batches) == [50, 100, 100]
+    assert commit_prs == [
+        [fake_repo.by_sha[sha]["pr"]] if fake_repo.by_sha[sha]["pr"] else []
+        for sha in shas
+    ]
+    # the pull requests come with the commits
+    pulls = resolver.get_pulls([1, 2])
+    assert pulls[2].body == fake_repo.pulls[2]["body"]
+    assert fake.counts["pull"] == 0
+
+
+def test_unmerged_pull_requests_are_dropped(fake, fake_repo):
+    no_pr = fake_repo.commits[5]
+    merged = fake_repo.commits[6]
+    open_pull = {
+        "number": 999,
+        "body": "### Features\n- Not merged",
+        "updated_at": no_pr["date"],
+    }
+    fake_repo.open_pulls[no_pr["sha"]] = [open_pull]
+    fake_repo.open_pulls[merged["sha"]] = [open_pull]
+
+    resolver = get_resolver(fake)
+
+    assert resolver.get_commit_prs([no_pr["sha"], merged["sha"]]) == [
+        [],
+        [merged["pr"]],
+    ]
+    assert 999 not in resolver._pulls
+
+
+def test_error_payload(fake, fake_repo):
+    fake.graphql_errors = [{"message": "Something went wrong"}]
+    resolver = get_resolver(fake)
+
+    with pytest.raises(Exception, match="Something went wrong"):
+        resolver.get_commit_prs([fake_repo.commits[1]["sha"]])
+
+
+def test_invalid_sha(fake):
+    with pytest.raises(ValueError):
+        get_resolver(fake).get_commit_prs(['") { id } x: object(oid: "'])
+    assert fake.graphql_batches == []
+
+
+def test_same_notes_as_scrape_resolver(fake, run):
+    run(
+        "--from-tag",
+        "1.0.0",
+        "--no-cache",
+        "gen",
+        "--to-tag",
+        "1.0.1",
+        "--markdown",
+        "--file-name",
+        "scrape",
+    )
+    run(
+        "--from-tag",
+        "1.0.0",
+        "--no-cache",
+        "--resolver",
+        "graphql",
+        "--github-access-token",
+        "token",
+        "gen",
+        "--to-tag",
+        "1.0.1",
+        "--markdown",
+        "--file-name",
+        "graphql",
+    )
+
+    assert fake.counts["graphql"] == 3
+    assert fake.counts["branch_commits"] == 250
+    assert read("graphql.md") == read("scrape.md")
+    assert "Feature number 125" in read("graphql.md")
@@ -0,0 +1,26 @@
+import subprocess
+import sys
+
+import pytest
+
+from check_import_time import HEAVY_MODULES, ROOT_DIR, SCENARIOS
+
+# print the top-level packages of the imported modules, after the `--help` output
+PRINT_MODULES = (
+    "\nimport sys\nprint(' '.join({name.split('.')[0] for name in sys.modules}))"
+)
+
+
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_no_heavy_modules_at_startup(scenario):
+    result = subprocess.run(
+        [sys.executable, "-c", SCENARIOS[scenario] + PRINT_MODULES],
+        cwd=ROOT_DIR,
+        stdout=subprocess.PIPE,
+        universal_newlines=True,
+        check=True,
+    )
+
+    modules = set(result.stdout.splitlines()[-1].split())
+    assert "gen3git" in modules
+    assert sorted(modules.intersection(HEAVY_MODULES)) == []
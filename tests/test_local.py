@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+
+import pytest
+from git import Repo
+
+import gen3git
+
+
+@pytest.mark.parametrize(
+    "message, pr",
+    [
+        ("Merge pull request #12 from org/feature\n\nA feature", 12),
+        ("Add a feature (#34)\n\n* first\n* second", 34),
+        ("  Add a feature (#34)  \n", 34),
+        ("Fix #56 in the parser", None),
+        ("Revert (#78) later\n", None),
+        ("Merge branch 'master' into feature", None),
+    ],
+)
+def test_get_subject_pr(message, pr):
+    assert gen3git.get_subject_pr(message) == pr
+
+
+@pytest.fixture
+def clone(tmp_path):
+    """
+    A clone with, between tags 1.0.0 and 1.0.1: the 2 commits of a branch merged
+    by PR #3, a squash commit of PR #4 and a commit without PR.
+    """
+    repo = Repo.init(str(tmp_path / "clone"))
+    repo.git.config("user.name", "Test")
+    repo.git.config("user.email", "test@example.com")
+    repo.git.symbolic_ref("HEAD", "refs/heads/master")
+    repo.git.commit("--allow-empty", "-m", "Initial commit")
+    repo.git.tag("1.0.0")
+    repo.git.checkout("-b", "feature")
+    repo.git.commit("--allow-empty", "-m", "Start the feature")
+    repo.git.commit("--allow-empty", "-m", "Finish the feature")
+    repo.git.checkout("master")
+    repo.git.merge("--no-ff", "feature", "-m", "Merge pull request #3 from org/feature")
+    repo.git.commit("--allow-empty", "-m", "Squashed feature (#4)")
+    repo.git.commit("--allow-empty", "-m", "Direct commit")
+    repo.git.tag("1.0.1")
+    return repo
+
+
+def get_sha(repo, message):
+    return next(c.hexsha for c in repo.iter_commits("--all") if c.summary == message)
+
+
+def test_get_local_commits(clone):
+    commits, known_prs = gen3git.get_local_commits(clone, "1.0.0..1.0.1")
+
+    assert [message.strip() for _, message in commits] == [
+        "Direct commit",
+        "Squashed feature (#4)",
+        "Merge pull request #3 from org/feature",
+        "Finish the feature",
+        "Start the feature",
+    ]
+    assert known_prs == {
+        get_sha(clone, "Squashed feature (#4)"): [4],
+        get_sha(clone, "Merge pull request #3 from org/feature"): [3],
+        get_sha(clone, "Finish the feature"): [3],
+        get_sha(clone, "Start the feature"): [3],
+    }
+
+
+class Resolver(object):
+    """
+    Resolver that records the commits it is asked about, none of them has a PR.
+    """
+
+    def __init__(self):
+        self.shas = []
+
+    def get_commit_prs(self, shas):
+        self.shas.extend(shas)
+        return [[] for _ in shas]
+
+    def get_pulls(self, numbers):
+        merged_at = datetime(2020, 1, 1)
+        return {
+            number: gen3git.PullRequest("PR %s" % number, merged_at, merged_at)
+            for number in numbers
+        }
+
+
+def test_unknown_commits_are_resolved_with_the_api(clone):
+    commits, known_prs = gen3git.get_local_commits(clone, "1.0.0..1.0.1")
+    resolver = Resolver()
+
+    desc_bodies = gen3git.resolve_desc_bodies(
+        resolver, commits, datetime.now(timezone.utc), known_prs
+    )
+
+    direct = get_sha(clone, "Direct commit")
+    assert resolver.shas == [direct]
+    assert desc_bodies == [
+        (direct[:6], "commit", "Direct commit\n"),
+        (4, "pr", "PR 4"),
+        (3, "pr", "PR 3"),
+    ]
@@ -0,0 +1,77 @@
+import io
+
+import gen3git
+from bench_parse_pr_body import SAMPLE_BODIES, reference_parse_pr_body
+
+
+def test_same_release_notes_as_the_previous_implementation():
+    desc_bodies = [(i, "pr", body) for i, body in enumerate(SAMPLE_BODIES)]
+    expected = {"general updates": []}
+    for ref, ref_type, body in desc_bodies:
+        reference_parse_pr_body(
+            body, expected, ref, ref_type, "uc-cdis/fence", "markdown"
+        )
+
+    assert gen3git.parse_pr_bodies(desc_bodies, repo_uri="uc-cdis/fence") == expected
+
+
+def test_entries_render_like_the_lines():
+    lines = {"general updates": []}
+    entries = {"general updates": []}
+    for i, body in enumerate(SAMPLE_BODIES):
+        gen3git.parse_pr_body(body, lines, i, "pr", "uc-cdis/fence", "markdown")
+        gen3git.parse_pr_entries(body, entries, i, "pr")
+
+    notes = gen3git.ReleaseNotes(
+        entries, repo_uri="uc-cdis/fence", link_type="markdown"
+    )
+    assert {
+        key: list(notes.get_lines(values, "markdown"))
+        for key, values in entries.items()
+    } == (lines)
+
+
+def test_links_of_each_export_type():
+    entries = {"general updates": []}
+    gen3git.parse_pr_entries("### Features\n- Added a feature\n", entries, 12, "pr")
+    notes = gen3git.ReleaseNotes(
+        entries, repo_uri="uc-cdis/fence", link_type="markdown"
+    )
+    sinks = {type_: io.StringIO() for type_ in gen3git.ReleaseNotes.ExportType}
+
+    notes.write(sinks, "Title", "", "")
+
+    url = "https://github.com/uc-cdis/fence/pull/12"
+    markdown = sinks[gen3git.ReleaseNotes.ExportType.MARKDOWN].getvalue()
+    html = sinks[gen3git.ReleaseNotes.ExportType.HTML].getvalue()
+    assert "[#12](%s)" % url in markdown
+    assert '<a href="%s">#12</a>' % url in html
+    assert "[#12]" not in html
+    assert url in sinks[gen3git.ReleaseNotes.ExportType.TEXT].getvalue()
+    assert "<%s|#12>" % url in sinks[gen3git.ReleaseNotes.ExportType.SLACK].getvalue()
+
+
+def test_skip_rules():
+    rules = gen3git.DEFAULT_PARSE_RULES.extend(
+        {"skip_contains": ["[skip]"], "skip_patterns": [r"WIP\b"]}
+    )
+    body = "### Features\n- Done [skip] here\n- WIP: later\n- Not WIP\n- Kept\n"
+
+    notes = gen3git.parse_pr_bodies([(1, "pr", body)], rules=rules)
+
+    # the strings are found anywhere, the patterns from the start of the line
+    assert notes["features"] == ["Not WIP (#1)", "Kept (#1)"]
+
+
+def test_bot_pull_request():
+    body = "Bumps a from 1 to 2.\nBumps b from 3 to 4.\n\nDependabot commands and options\n"
+
+    notes = gen3git.parse_pr_bodies([(7, "pr", body)], repo_uri="uc-cdis/fence")
+
+    assert notes == {
+        "general updates": [],
+        "dependency updates": [
+            "Bumps a from 1 to 2. (#7)",
+            "Bumps b from 3 to 4. (#7)",
+        ],
+    }
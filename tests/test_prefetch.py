@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+
+import gen3git
+from conftest import read
+
+
+def test_prefetched_pulls_take_precedence_over_the_cache(fake, fake_repo):
+    args = gen3git.get_command_line_args(
+        ["--github-api-url", fake.url, "--prefetch-pulls", "gen"]
+    )
+    session = gen3git.GitHubSession(api_url=fake.url)
+    g = gen3git.get_github_client(None, fake.url)
+    session.attach(g)
+    repo = g.get_repo("org/repo")
+    fresh = fake_repo.pulls[10]
+    cache = gen3git.MemoryResolverCache()
+    cache.set_pulls(
+        "org/repo",
+        {
+            10: gen3git.PullRequest(
+                "### Features\n- Stale", fresh["merged_at"], fresh["merged_at"]
+            )
+        },
+    )
+    resolver = gen3git.get_resolver(
+        args, repo, "org/repo", session, cache, since=datetime(2020, 1, 1)
+    )
+
+    assert resolver.get_pulls([10])[10].body == fresh["body"]
+    assert fake.counts["pull"] == 0
+
+
+def test_prefetch_pulls(fake, run):
+    run(
+        "--from-tag",
+        "1.0.0",
+        "--prefetch-pulls",
+        "gen",
+        "--to-tag",
+        "1.0.1",
+        "--markdown",
+        "--file-name",
+        "notes",
+    )
+
+    assert "Feature number 10," in read("notes.md")
+    assert fake.counts["pulls"] == 1
+    assert fake.counts["pull"] == 0
+
+
+def test_prefetch_pulls_with_naive_dates():
+    # older PyGithub versions return naive UTC datetimes
+    class Pull(object):
+        def __init__(self, number, updated_at):
+            self.number = number
+            self.body = "### Features\n- Feature %s" % number
+            self.merged_at = updated_at
+            self.updated_at = updated_at
+
+    class Repository(object):
+        default_branch = "master"
+
+        def get_pulls(self, **kwargs):
+            return [Pull(2, datetime(2020, 1, 3)), Pull(1, datetime(2019, 12, 1))]
+
+    pulls = gen3git.prefetch_pulls(
+        Repository(), datetime(2020, 1, 1, tzinfo=timezone.utc)
+    )
+
+    assert list(pulls) == [2]
+    assert pulls[2].updated_at == datetime(2020, 1, 3, tzinfo=timezone.utc)
+    assert pulls[2].merged_at.tzinfo == timezone.utc
@@ -0,0 +1,148 @@
+import hashlib
+import hmac
+import json
+import os
+import threading
+
+import pytest
+import requests
+
+import gen3git
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "webhooks")
+SECRET = "secret"
+
+
+@pytest.fixture
+def service(fake):
+    args = gen3git.get_command_line_args(
+        [
+            "--github-url",
+            fake.url,
+            "--github-api-url",
+            fake.url,
+            "serve",
+            "--port",
+            "0",
+            "--webhook-secret",
+            SECRET,
+        ]
+    )
+    session = gen3git.GitHubSession(api_url=fake.url)
+    g = gen3git.get_github_client(None, fake.url)
+    session.attach(g)
+    service = gen3git.ReleaseNotesService(args, g, session)
+    server = gen3git.get_service_server(args, service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    service.url = "http://127.0.0.1:%s" % server.server_address[1]
+    yield service
+    server.shutdown()
+    server.server_close()
+
+
+def post_webhook(service, event, name=None, payload=None):
+    if name:
+        with open(os.path.join(FIXTURES_DIR, name + ".json"), "rb") as f:
+            body = f.read()
+    else:
+        body = json.dumps(payload).encode()
+    signature = hmac.new(SECRET.encode(), body, hashlib.sha256).hexdigest()
+    return requests.post(
+        service.url + "/webhook",
+        data=body,
+        headers={"X-GitHub-Event": event, "X-Hub-Signature-256": "sha256=" + signature},
+    )
+
+
+def get_notes(service):
+    resp = requests.get(
+        service.url + "/repos/org/repo/notes",
+        params={"from_tag": "1.0.0", "to_tag": "1.0.1"},
+    )
+    assert resp.status_code == 200
+    return resp.text
+
+
+def test_pull_request_edited_after_merge(fake, service):
+    assert "Feature number 10," in get_notes(service)
+
+    resp = post_webhook(service, "pull_request", "pull_request_merged")
+    assert resp.status_code == 200
+    assert resp.json() == {"repo": "org/repo", "event": "pull_request", "pulls": [10]}
+    resp = post_webhook(service, "pull_request", "pull_request_edited")
+    assert resp.status_code == 200
+
+    pulls = fake.counts["pull"]
+    notes = get_notes(service)
+    assert "Edited feature 10," in notes
+    assert "Feature number 10," not in notes
+    assert fake.counts["pull"] == pulls
+    cached = service.cache.get_pulls("org/repo", [10])[10]
+    assert cached.updated_at.isoformat() == "2020-02-01T09:30:00+00:00"
+
+
+def test_webhook_before_render(fake, service):
+    assert post_webhook(service, "pull_request", "pull_request_edited").ok
+
+    notes = get_notes(service)
+
+    assert "Edited feature 10," in notes
+    assert "Feature number 10," not in notes
+    # read from the cache filled by the webhook
+    assert fake.counts["pull"] == 24
+
+
+def test_push(service):
+    resp = post_webhook(service, "push", "push")
+
+    assert resp.json() == {"repo": "org/repo", "event": "push", "commits": 2}
+    assert service.cache.get_commit_prs(
+        "org/repo", ["%040x" % 0x79, "%040x" % 0x7A]
+    ) == {"%040x" % 0x79: [61]}
+
+
+def test_push_tag(service):
+    get_notes(service)
+
+    resp = post_webhook(service, "push", "push_tag")
+
+    assert resp.json() == {"repo": "org/repo", "event": "push", "tag": "1.0.3"}
+    assert service._repos["org/repo"][1] is None
+
+
+def test_invalid_signature(service):
+    resp = requests.post(
+        service.url + "/webhook",
+        data=b"{}",
+        headers={"X-GitHub-Event": "push", "X-Hub-Signature-256": "sha256=0"},
+    )
+
+    assert resp.status_code == 401
+
+
+def test_webhook_error(service):
+    payload = {
+        "repository": {"full_name": "org/repo"},
+        "pull_request": {"number": 1, "merged_at": "yesterday"},
+    }
+
+    resp = post_webhook(service, "pull_request", payload=payload)
+
+    assert resp.status_code == 500
+    assert resp.text.startswith("Failed to handle the webhook")
+
+
+@pytest.mark.parametrize(
+    "host,served", [("127.0.0.1", True), ("localhost", True), ("0.0.0.0", False)]
+)
+def test_webhook_secret_required_on_other_hosts(fake, host, served, monkeypatch):
+    monkeypatch.delenv("GEN3GIT_WEBHOOK_SECRET", raising=False)
+    args = gen3git.get_command_line_args(["serve", "--host", host, "--port", "0"])
+    service = gen3git.ReleaseNotesService(args, None, gen3git.GitHubSession())
+
+    if served:
+        gen3git.get_service_server(args, service).server_close()
+    else:
+        with pytest.raises(gen3git.ReleaseNotesError):
+            gen3git.get_service_server(args, service)
@@ -0,0 +1,80 @@
+import json
+
+import gen3git
+
+ENTRIES = [
+    gen3git.Entry("Line %s\nwith a break" % i, i, "pr", None, True) for i in range(10)
+]
+
+
+def test_items_are_spilled_to_disk():
+    items = gen3git.SpillList(max_items=3, load=gen3git.Entry._make)
+    items.extend(ENTRIES)
+
+    assert len(items) == 10
+    # at most 3 items in memory
+    assert len(items._items) < 3
+    assert items._file is not None
+    assert list(items) == ENTRIES
+    # iterating again, and after appending
+    assert list(items) == ENTRIES
+    items.append(ENTRIES[0])
+    assert list(items) == ENTRIES + ENTRIES[:1]
+
+    items.close()
+
+
+def test_strings_are_not_spilled_below_the_limit():
+    items = gen3git.SpillList(["a", "b"], max_items=3)
+
+    assert items._file is None
+    assert list(items) == ["a", "b"]
+
+
+def test_close_removes_the_spilled_items():
+    categories = gen3git.SpilledCategories({"general updates": []}, max_items=2)
+    categories.setdefault("features").extend(["a", "b", "c"])
+    categories["fixes"] = ["d", "e"]
+    files = [values._file for values in categories.values()]
+
+    assert isinstance(categories["general updates"], gen3git.SpillList)
+    assert files[0] is None
+    assert all(files[1:])
+    categories.close()
+
+    assert all(f.closed for f in files[1:])
+    assert all(values._file is None for values in categories.values())
+
+
+def test_spilled_items_are_saved():
+    release_notes = gen3git.SpilledCategories(
+        {"general updates": [], "features": ENTRIES},
+        max_items=3,
+        load=gen3git.Entry._make,
+    )
+    gen3git.save_checkpoint(
+        "checkpoint.json", {"repo": "org/repo"}, "a" * 40, {1, 2}, release_notes
+    )
+    gen3git.save_artifact(
+        "artifact.json", "org/repo", "org/repo", "1.0.0", "1.0.1", release_notes
+    )
+
+    checkpoint = gen3git.load_checkpoint("checkpoint.json", {"repo": "org/repo"})
+    with open("artifact.json") as f:
+        artifact = json.load(f)
+    expected = {"general updates": [], "features": [list(e) for e in ENTRIES]}
+    assert checkpoint["release_notes"] == artifact["entries"] == expected
+    assert checkpoint["prs"] == [1, 2]
+    release_notes.close()
+
+
+def test_dump_json_like_json_dump():
+    obj = {"a": [1, {"b": None}], "c": gen3git.SpillList(["x", "y\n"], max_items=1)}
+
+    for separators in (None, (",", ":")):
+        with open("dump.json", "w") as f:
+            gen3git.dump_json(obj, f, separators)
+        with open("dump.json") as f:
+            assert f.read() == json.dumps(
+                dict(obj, c=["x", "y\n"]), separators=separators
+            )
@@ -0,0 +1,72 @@
+from collections import namedtuple
+
+import pytest
+
+import gen3git
+
+Tag = namedtuple("Tag", ["name", "commit"])
+Commit = namedtuple("Commit", ["sha"])
+
+
+def get_index(*names):
+    # listed newest first, like GitHub does
+    return gen3git.TagIndex(Tag(name, Commit("sha-" + name)) for name in names)
+
+
+@pytest.mark.parametrize(
+    "name, previous",
+    [
+        # the versions are compared, not the names or the listing order
+        ("2.0.0", "1.10.0"),
+        ("1.10.0", "1.9.0"),
+        ("1.9.0", "1.2.0"),
+        # the greatest version overall
+        (None, "2.0.0"),
+        # a tag that does not exist yet
+        ("1.5.0", "1.2.0"),
+        ("3.0.0", "2.0.0"),
+        # non-semantic tags are ignored when there are versions
+        ("master", "2.0.0"),
+        ("release-a", "2.0.0"),
+        # calendar versions are versions too
+        ("2020.05", "2.0.0"),
+    ],
+)
+def test_get_previous(name, previous):
+    index = get_index("1.9.0", "master", "2.0.0", "1.2.0", "release-a", "1.10.0")
+
+    assert index.get_previous(name).name == previous
+
+
+def test_get_previous_of_the_first_tag():
+    index = get_index("1.1.0", "1.0.0", "release-a", "release-b")
+
+    # the first non-semantic tag is used when there is no lower version
+    assert index.get_previous("1.0.0").name == "release-a"
+    assert index.get_previous("0.1.0").name == "release-a"
+    assert index.get_previous("release-a").name == "1.1.0"
+
+
+def test_get_previous_without_versions():
+    index = get_index("release-b", "release-a")
+
+    assert index.get_previous("release-b").name == "release-a"
+    assert index.get_previous().name == "release-b"
+    assert get_index("release-a").get_previous("release-a") is None
+    assert get_index("1.0.0").get_previous("1.0.0") is None
+    assert get_index().get_previous() is None
+
+
+def test_get():
+    index = gen3git.TagIndex(
+        [
+            Tag("1.0.0", Commit("a")),
+            Tag("latest", Commit("a")),
+            Tag("0.9.0", Commit("b")),
+        ]
+    )
+
+    assert index.get("latest").name == "latest"
+    assert index.get("missing") is None
+    assert index.get_names("a") == ["1.0.0", "latest"]
+    assert index.get_names("c") == []